@@ -1,48 +1,343 @@
-from groq import Groq
 import os
 import random
-from typing import List, Dict, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
 import re
-from dotenv import load_dotenv
 
-load_dotenv()
+from context_packer import ContextPacker
+from groq_transport import GroqTransport
+from metrics import metrics
+from model_router import FAST_MODEL, ModelRouter
+from response_cache import ResponseCache
+from structured_output import (JSON_RESPONSE_FORMAT, StructuredOutputError, parse_json_object, should_split,
+                               validate_items)
+
+DEFAULT_MODEL = FAST_MODEL  # Llama 3 8B; per-task models come from the ModelRouter
+EVALUATION_SCORES = ("Excellent", "Good", "Fair", "Poor")
+GROQ_API_KEY = "YOUR_GROQAI_API_KEY"  # PASTE YOUR GROQ API KEY or set GROQ_API_KEY
+
+_env_loaded = False
+
+
+def groq_api_key() -> str:
+    """GROQ_API_KEY from the environment or .env, read when an assistant creates its transport"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+    return os.getenv("GROQ_API_KEY", GROQ_API_KEY)
+
+
+class AnswerStreamParser:
+    """Incrementally split a streamed 'Answer: ... Justification: ...' response"""
+
+    ANSWER_MARKER = "Answer:"
+    JUSTIFICATION_MARKER = "\nJustification:"
 
-class AIAssistant:
     def __init__(self):
+        self.buffer = ""
+        self._answer_start = None
+        self._justification_start = None
+        self._scan_from = 0
+
+    def feed(self, delta: str) -> None:
+        """Add a streamed delta, scanning only the newly arrived text for markers"""
+        self.buffer += delta
+        if self._answer_start is None:
+            index = self.buffer.find(self.ANSWER_MARKER, self._scan_from)
+            if index < 0:
+                self._scan_from = max(0, len(self.buffer) - len(self.ANSWER_MARKER) + 1)
+                return
+            self._answer_start = self._scan_from = index + len(self.ANSWER_MARKER)
+
+        if self._justification_start is None:
+            index = self.buffer.find(self.JUSTIFICATION_MARKER, self._scan_from)
+            if index < 0:
+                self._scan_from = max(self._answer_start, len(self.buffer) - len(self.JUSTIFICATION_MARKER) + 1)
+            else:
+                self._justification_start = index
+
+    @property
+    def answer(self) -> str:
+        if self._answer_start is None:
+            return ""
+        end = self._justification_start
+        if end is None:
+            # Hold back a partially streamed "\nJustification:" so it never flashes in the answer
+            end = len(self.buffer)
+            for size in range(len(self.JUSTIFICATION_MARKER) - 1, 0, -1):
+                if self.buffer.endswith(self.JUSTIFICATION_MARKER[:size]):
+                    end -= size
+                    break
+        return self.buffer[self._answer_start:max(end, self._answer_start)].strip()
+
+    @property
+    def justification(self) -> str:
+        if self._justification_start is None:
+            return ""
+        return self.buffer[self._justification_start + len(self.JUSTIFICATION_MARKER):].strip()
+
+class AIAssistant:
+    # Upper bounds on document tokens per task; the model's window still applies
+    answer_context_tokens = 1500
+    challenge_context_tokens = 3000
+    evaluation_context_tokens = 1000
+    # Parallel section summaries in map-reduce summarization
+    map_concurrency = 8
+    # Items per JSON-mode call in the batched APIs, and completion tokens reserved per item
+    answer_batch_size = 5
+    evaluation_batch_size = 8
+    batch_answer_tokens = 300
+    batch_evaluation_tokens = 250
+
+    def __init__(self, cache: ResponseCache = None, packer: ContextPacker = None,
+                 transport: GroqTransport = None, router: ModelRouter = None):
         self.conversation_history = []
-        # Initialize Groq client
-        self.client = Groq(
-            api_key="YOUR_GROQAI_API_KEY" #PASTE YOUR GROQ API KEY
-        )
+        # Pooled connections, retries, deadlines and the circuit breaker live here
+        self.transport = transport or GroqTransport(api_key=groq_api_key())
+        # Which model serves each task, and when to escalate to the next one
+        self.router = router or ModelRouter()
+        # Identical prompts are answered from here instead of calling Groq again
+        self.cache = cache if cache is not None else ResponseCache()
+        self.packer = packer or ContextPacker()
+        # Batches whose reply failed validation and were retried as two halves
+        self.batch_splits = 0
 
-    def generate_summary(self, document_content: str) -> str:
-        """Generate a concise summary of the document (≤300 words)"""
-        prompt = f"""
+    @property
+    def client(self):
+        """Groq client, created on first use so importing this module stays cheap"""
+        return self.transport.client
+
+    def _complete(self, prompt: str, max_tokens: int, temperature: float,
+                  model: Optional[str] = None, use_cache: bool = True, task: str = 'completion',
+                  response_format: Dict = None, validate: Callable[[str], object] = None) -> str:
+        """Run a single-prompt chat completion, going through the response cache
+
+        The task's route picks the model unless one is given. validate raises
+        StructuredOutputError to escalate a reply to the route's next model.
+        """
+        stage = f"llm.{task}"
+        key = self._cache_key(task, model, temperature, max_tokens, prompt)
+        if use_cache:
+            cached = self.cache.get(key)
+            metrics.record_cache(stage, cached is not None)
+            if cached is not None:
+                return cached
+
+        def call(model_name: str, deadline: Optional[float]):
+            request = self.completion_request(prompt, max_tokens, temperature, model_name, response_format)
+            return self.transport.create(deadline=deadline, **request)
+
+        with metrics.timer(stage):
+            _, response = self.router.complete(task, call, self._reply_check(validate), model=model)
+        metrics.record_usage(stage, response)
+        content = response.choices[0].message.content.strip()
+
+        # Bypassed calls still refresh the cache so the next normal call is a hit
+        self.cache.put(key, content)
+        return content
+
+    def _cache_key(self, task: str, model: Optional[str], temperature: float, max_tokens: int,
+                   prompt: str) -> str:
+        # Keyed by the route's first model, whichever model in the chain ends up answering
+        return ResponseCache.make_key(self.router.route(task, model).models[0], temperature, max_tokens, prompt)
+
+    @staticmethod
+    def _reply_check(validate: Optional[Callable[[str], object]]):
+        if validate is None:
+            return None
+        return lambda response: validate(response.choices[0].message.content.strip())
+
+    @staticmethod
+    def completion_request(prompt: str, max_tokens: int, temperature: float, model: str,
+                           response_format: Dict = None) -> Dict:
+        request = {
+            'model': model,
+            'messages': [{"role": "user", "content": prompt}],
+            'max_tokens': max_tokens,
+            'temperature': temperature
+        }
+        if response_format is not None:
+            request['response_format'] = response_format
+        return request
+
+    def _stream_complete(self, prompt: str, max_tokens: int, temperature: float,
+                         model: Optional[str] = None, use_cache: bool = True,
+                         task: str = 'completion') -> Iterator[str]:
+        """Streaming counterpart of _complete that yields content deltas as they arrive"""
+        stage = f"llm.{task}"
+        key = self._cache_key(task, model, temperature, max_tokens, prompt)
+        if use_cache:
+            cached = self.cache.get(key)
+            metrics.record_cache(stage, cached is not None)
+            if cached is not None:
+                yield cached
+                return
+
+        # Timed by hand so time to first token is recorded alongside the total
+        start = time.perf_counter()
+        parts = []
+        try:
+            def open_stream(model_name: str, deadline: Optional[float]):
+                return self.transport.stream(
+                    deadline=deadline,
+                    model=model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+
+            for chunk in self.router.stream(task, open_stream, model=model):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if not parts:
+                        metrics.observe(f"{stage}.first_token", time.perf_counter() - start)
+                    parts.append(delta)
+                    yield delta
+        except Exception:
+            metrics.observe(stage, time.perf_counter() - start, error=True)
+            raise
+        metrics.observe(stage, time.perf_counter() - start)
+        # Streamed chunks carry no usage block, so estimate with the packer's counter
+        metrics.record_tokens(stage, self.packer.counter.count(prompt), self.packer.counter.count("".join(parts)))
+
+        self.cache.put(key, "".join(parts).strip())
+
+    def _summary_template(self, document_text: str) -> str:
+        return f"""
         Please provide a concise summary of the following document in no more than 150 words. 
         Focus on the main points, key findings, and overall purpose of the document.
         
         Document:
-        {document_content[:3000]}  # Limit input to avoid token limits
+        {document_text}
         
         Summary (≤300 words):
         """
 
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",  # Using Llama 3 8B model
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=200,
-                temperature=0.3
+    def _section_summary_template(self, section_text: str) -> str:
+        return f"""
+        The following is one section of a longer document. Summarize it in no more than 100 words,
+        keeping its key findings, figures and conclusions.
+        
+        Section:
+        {section_text}
+        
+        Section summary:
+        """
+
+    def _merge_summary_template(self, summaries_text: str) -> str:
+        return f"""
+        The following are summaries of consecutive sections of one document, in order.
+        Combine them into a single concise summary of the whole document in no more than 150 words.
+        Focus on the main points, key findings, and overall purpose of the document.
+        
+        Section summaries:
+        {summaries_text}
+        
+        Summary (≤150 words):
+        """
+
+    def build_summary_prompt(self, document_content: str) -> str:
+        budget = self.packer.budget(DEFAULT_MODEL, self._summary_template(""), 200)
+        return self._summary_template(self.packer.truncate(document_content, budget))
+
+    def summary_sections(self, document_content: str) -> List[str]:
+        """The document as one piece if it fits a summary prompt, else token-sized sections"""
+        budget = self.packer.budget(DEFAULT_MODEL, self._summary_template(""), 200)
+        if self.packer.fits(document_content, budget):
+            return [document_content]
+        section_budget = self.packer.budget(DEFAULT_MODEL, self._section_summary_template(""), 200)
+        return self.packer.split(document_content, section_budget)
+
+    def group_for_merge(self, summaries: List[str]) -> List[List[str]]:
+        """Split section summaries into runs that each fit one merge prompt"""
+        budget = self.packer.budget(DEFAULT_MODEL, self._merge_summary_template(""), 200)
+        groups = [[]]
+        used = 0
+        for summary in summaries:
+            cost = self.packer.counter.count(summary) + 2
+            if groups[-1] and used + cost > budget:
+                groups.append([])
+                used = 0
+            groups[-1].append(summary)
+            used += cost
+        return groups
+
+    def build_merge_prompt(self, summaries: List[str]) -> str:
+        return self._merge_summary_template("\n\n".join(summaries))
+
+    def _complete_many(self, prompts: List[str], max_tokens: int, temperature: float,
+                       use_cache: bool = True, task: str = 'completion') -> List[str]:
+        """Run independent completions concurrently, preserving order"""
+        def complete(prompt: str) -> str:
+            return self._complete(prompt, max_tokens, temperature, use_cache=use_cache, task=task)
+
+        return self._map(complete, prompts)
+
+    def _map(self, function, items: List) -> List:
+        """Apply function to items concurrently, preserving order"""
+        if len(items) <= 1:
+            return [function(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(len(items), self.map_concurrency)) as pool:
+            return list(pool.map(function, items))
+
+    def final_summary_prompt(self, document_content: str, use_cache: bool = True) -> str:
+        """Prompt for the final summary, running the map-reduce stages first if needed
+
+        Long documents are cut into sections that are summarized concurrently,
+        and those summaries are merged (in more rounds only if they would not
+        fit one prompt). Latency therefore grows with the number of rounds,
+        not with the number of pages.
+        """
+        sections = self.summary_sections(document_content)
+        if len(sections) == 1:
+            return self.build_summary_prompt(sections[0])
+
+        summaries = self._complete_many(
+            [self._section_summary_template(section) for section in sections],
+            max_tokens=200, temperature=0.3, use_cache=use_cache, task='section_summary'
+        )
+        groups = self.group_for_merge(summaries)
+        while len(groups) > 1:
+            summaries = self._complete_many(
+                [self.build_merge_prompt(group) for group in groups],
+                max_tokens=200, temperature=0.3, use_cache=use_cache, task='merge_summary'
             )
-            return response.choices[0].message.content.strip()
+            groups = self.group_for_merge(summaries)
+        return self.build_merge_prompt(groups[0])
+
+    def generate_summary(self, document_content: str, use_cache: bool = True) -> str:
+        """Generate a concise summary of the document (≤300 words)"""
+        try:
+            prompt = self.final_summary_prompt(document_content, use_cache=use_cache)
+            return self._complete(prompt, max_tokens=200, temperature=0.3,
+                                  use_cache=use_cache, task='summary')
         except Exception as e:
             return f"Error generating summary: {str(e)}"
 
-    def answer_question(self, question: str, document_content: str, relevant_contexts: List[str]) -> Dict:
-        """Answer a question based on the document with justification"""
-        context_text = "\n\n".join(relevant_contexts) if relevant_contexts else document_content[:2000]
+    def stream_summary(self, document_content: str, use_cache: bool = True) -> Iterator[str]:
+        """Generate the document summary, yielding text deltas as they are produced"""
+        try:
+            prompt = self.final_summary_prompt(document_content, use_cache=use_cache)
+            yield from self._stream_complete(prompt, max_tokens=200, temperature=0.3,
+                                             use_cache=use_cache, task='summary')
+        except Exception as e:
+            yield f"Error generating summary: {str(e)}"
 
-        prompt = f"""
+    def build_answer_prompt(self, question: str, document_content: str, relevant_contexts: List[str]) -> str:
+        # Ranked contexts are packed best-first into the token budget
+        template = self._answer_template(question, "")
+        budget = self.packer.budget(DEFAULT_MODEL, template, 400, cap=self.answer_context_tokens)
+        if relevant_contexts:
+            context_text = self.packer.pack(relevant_contexts, budget)
+        else:
+            context_text = self.packer.truncate(document_content, budget)
+        return self._answer_template(question, context_text)
+
+    def _answer_template(self, question: str, context_text: str) -> str:
+        return f"""
         Based on the following document content, please answer the question. 
         Your answer must be grounded in the provided text and include a clear justification 
         referencing specific parts of the document.
@@ -62,39 +357,70 @@ class AIAssistant:
         Justification: [Reference to specific document section/paragraph]
         """
 
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",  # Using Llama 3 8B model
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400,
-                temperature=0.2
-            )
+    def validate_answer(self, full_response: str) -> None:
+        if AnswerStreamParser.ANSWER_MARKER not in full_response:
+            raise StructuredOutputError("Reply has no 'Answer:' section")
+
+    def parse_answer(self, full_response: str, relevant_contexts: List[str]) -> Dict:
+        """Split a completed response into answer and justification"""
+        answer_match = re.search(r'Answer:\s*(.*?)(?=\nJustification:|$)', full_response, re.DOTALL)
+        justification_match = re.search(r'Justification:\s*(.*)', full_response, re.DOTALL)
 
-            full_response = response.choices[0].message.content.strip()
+        answer = answer_match.group(1).strip() if answer_match else full_response
+        justification = justification_match.group(1).strip() if justification_match else "Based on document analysis"
+
+        return {
+            'answer': answer,
+            'justification': justification,
+            'contexts_used': relevant_contexts
+        }
+
+    def answer_question(self, question: str, document_content: str, relevant_contexts: List[str],
+                        use_cache: bool = True) -> Dict:
+        """Answer a question based on the document with justification"""
+        prompt = self.build_answer_prompt(question, document_content, relevant_contexts)
+
+        try:
+            full_response = self._complete(prompt, max_tokens=400, temperature=0.2,
+                                           use_cache=use_cache, task='answer', validate=self.validate_answer)
 
             # Parse the response to extract answer and justification
-            answer_match = re.search(r'Answer:\s*(.*?)(?=\nJustification:|$)', full_response, re.DOTALL)
-            justification_match = re.search(r'Justification:\s*(.*)', full_response, re.DOTALL)
+            return self.parse_answer(full_response, relevant_contexts)
 
-            answer = answer_match.group(1).strip() if answer_match else full_response
-            justification = justification_match.group(1).strip() if justification_match else "Based on document analysis"
+        except Exception as e:
+            return self.answer_error(e)
 
-            return {
-                'answer': answer,
-                'justification': justification,
-                'contexts_used': relevant_contexts
-            }
+    def stream_answer(self, question: str, document_content: str, relevant_contexts: List[str],
+                      use_cache: bool = True) -> Iterator[Dict]:
+        """Answer a question, yielding partial answer/justification dicts while streaming
+
+        The last dict yielded is the same fully parsed result answer_question returns.
+        """
+        prompt = self.build_answer_prompt(question, document_content, relevant_contexts)
+        parser = AnswerStreamParser()
+
+        try:
+            for delta in self._stream_complete(prompt, max_tokens=400, temperature=0.2,
+                                               use_cache=use_cache, task='answer'):
+                parser.feed(delta)
+                yield {
+                    'answer': parser.answer,
+                    'justification': parser.justification,
+                    'contexts_used': relevant_contexts
+                }
+
+            yield self.parse_answer(parser.buffer.strip(), relevant_contexts)
 
         except Exception as e:
-            return {
-                'answer': f"Error processing question: {str(e)}",
-                'justification': "Error in AI processing",
-                'contexts_used': []
-            }
+            yield self.answer_error(e)
 
-    def generate_challenge_questions(self, document_content: str) -> List[Dict]:
-        """Generate 3 logic-based questions from the document"""
-        prompt = f"""
+    def build_challenge_prompt(self, document_content: str) -> str:
+        budget = self.packer.budget(DEFAULT_MODEL, self._challenge_template(""), 600,
+                                    cap=self.challenge_context_tokens)
+        return self._challenge_template(self.packer.truncate(document_content, budget))
+
+    def _challenge_template(self, document_text: str) -> str:
+        return f"""
         Based on the following document, generate exactly 3 challenging questions that test 
         comprehension and logical reasoning. Each question should:
         1. Require understanding of the document's content
@@ -102,31 +428,21 @@ class AIAssistant:
         3. Have a clear answer that can be found in or derived from the document
         
         Document:
-        {document_content[:2500]}
-        
-        Please format each question as:
-        Question 1: [Question text]
-        Expected Answer: [Brief expected answer]
+        {document_text}
         
-        Question 2: [Question text]  
-        Expected Answer: [Brief expected answer]
-        
-        Question 3: [Question text]
-        Expected Answer: [Brief expected answer]
+        Respond with a JSON object of this form:
+        {{"questions": [{{"question": "Question text", "expected_answer": "Brief expected answer"}}]}}
         """
 
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",  # Using Llama 3 8B model
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=600,
-                temperature=0.4
-            )
-
-            questions_text = response.choices[0].message.content.strip()
-            questions = self.parse_challenge_questions(questions_text)
+    def generate_challenge_questions(self, document_content: str, use_cache: bool = True) -> List[Dict]:
+        """Generate 3 logic-based questions from the document"""
+        prompt = self.build_challenge_prompt(document_content)
 
-            return questions
+        try:
+            questions_text = self._complete(prompt, max_tokens=600, temperature=0.4,
+                                            use_cache=use_cache, task='challenge',
+                                            response_format=JSON_RESPONSE_FORMAT, validate=self.validate_challenge)
+            return self.parse_challenge_response(questions_text)
 
         except Exception as e:
             return [
@@ -136,6 +452,21 @@ class AIAssistant:
                 }
             ]
 
+    def parse_challenge_response(self, questions_text: str) -> List[Dict]:
+        """Questions from a JSON reply, or from the older plain-text format if it is not JSON"""
+        try:
+            data = parse_json_object(questions_text)
+            items = data.get('questions')
+            count = min(3, len(items)) if isinstance(items, list) else 0
+            return validate_items(data, 'questions', count, required=('question', 'expected_answer'),
+                                  numbered=False)
+        except StructuredOutputError:
+            return self.parse_challenge_questions(questions_text)
+
+    def validate_challenge(self, questions_text: str) -> None:
+        if not self.parse_challenge_response(questions_text):
+            raise StructuredOutputError("Reply has no challenge questions")
+
     def parse_challenge_questions(self, questions_text: str) -> List[Dict]:
         """Parse generated questions into structured format"""
         questions = []
@@ -157,14 +488,21 @@ class AIAssistant:
 
         return questions[:3]  # Ensure we return exactly 3 questions
 
-    def evaluate_answer(self, user_answer: str, question: str, expected_answer: str, document_content: str) -> Dict:
-        """Evaluate user's answer to a challenge question"""
-        prompt = f"""
+    def build_evaluation_prompt(self, user_answer: str, question: str, expected_answer: str,
+                                document_content: str) -> str:
+        template = self._evaluation_template(user_answer, question, expected_answer, "")
+        budget = self.packer.budget(DEFAULT_MODEL, template, 300, cap=self.evaluation_context_tokens)
+        return self._evaluation_template(user_answer, question, expected_answer,
+                                         self.packer.truncate(document_content, budget))
+
+    def _evaluation_template(self, user_answer: str, question: str, expected_answer: str,
+                             document_text: str) -> str:
+        return f"""
         A user was asked a question about a document and provided an answer. 
         Please evaluate their answer and provide feedback.
         
         Document Context:
-        {document_content[:2000]}
+        {document_text}
         
         Question: {question}
         Expected Answer: {expected_answer}
@@ -181,30 +519,247 @@ class AIAssistant:
         Correct Answer: [Correct answer with document reference]
         """
 
-        try:
-            response = self.client.chat.completions.create(
-                model="llama3-8b-8192",  # Using Llama 3 8B model
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
-                temperature=0.3
-            )
+    def validate_evaluation(self, evaluation: str) -> None:
+        score_match = re.search(r'Score:\W*(\w+)', evaluation)
+        if not score_match or score_match.group(1).capitalize() not in EVALUATION_SCORES:
+            raise StructuredOutputError("Reply has no valid 'Score:'")
+
+    def parse_evaluation(self, evaluation: str, expected_answer: str) -> Dict:
+        """Extract score, feedback and correct answer from an evaluation"""
+        score_match = re.search(r'Score:\s*(.*?)(?=\nFeedback:|$)', evaluation, re.DOTALL)
+        feedback_match = re.search(r'Feedback:\s*(.*?)(?=\nCorrect Answer:|$)', evaluation, re.DOTALL)
+        correct_answer_match = re.search(r'Correct Answer:\s*(.*)', evaluation, re.DOTALL)
 
-            evaluation = response.choices[0].message.content.strip()
+        return {
+            'score': score_match.group(1).strip() if score_match else "Good",
+            'feedback': feedback_match.group(1).strip() if feedback_match else evaluation,
+            'correct_answer': correct_answer_match.group(1).strip() if correct_answer_match else expected_answer
+        }
+
+    def evaluate_answer(self, user_answer: str, question: str, expected_answer: str, document_content: str,
+                        use_cache: bool = True) -> Dict:
+        """Evaluate user's answer to a challenge question"""
+        prompt = self.build_evaluation_prompt(user_answer, question, expected_answer, document_content)
+
+        try:
+            evaluation = self._complete(prompt, max_tokens=300, temperature=0.3,
+                                        use_cache=use_cache, task='evaluation',
+                                        validate=self.validate_evaluation)
 
             # Parse evaluation
-            score_match = re.search(r'Score:\s*(.*?)(?=\nFeedback:|$)', evaluation, re.DOTALL)
-            feedback_match = re.search(r'Feedback:\s*(.*?)(?=\nCorrect Answer:|$)', evaluation, re.DOTALL)
-            correct_answer_match = re.search(r'Correct Answer:\s*(.*)', evaluation, re.DOTALL)
-
-            return {
-                'score': score_match.group(1).strip() if score_match else "Good",
-                'feedback': feedback_match.group(1).strip() if feedback_match else evaluation,
-                'correct_answer': correct_answer_match.group(1).strip() if correct_answer_match else expected_answer
-            }
+            return self.parse_evaluation(evaluation, expected_answer)
 
         except Exception as e:
-            return {
-                'score': "Error",
-                'feedback': f"Error evaluating answer: {str(e)}",
-                'correct_answer': expected_answer
+            return self.evaluation_error(e, expected_answer)
+
+    # Batched APIs: several items per JSON-mode completion
+
+    @staticmethod
+    def batches(count: int, size: int) -> List[range]:
+        """Index ranges of consecutive batches of at most size items"""
+        size = max(1, size)
+        return [range(start, min(start + size, count)) for start in range(0, count, size)]
+
+    def build_answers_prompt(self, questions: List[str], document_content: str,
+                             contexts_per_question: List[List[str]]) -> Tuple[str, List[List[str]]]:
+        """JSON-mode prompt answering several questions from one shared set of excerpts
+
+        Contexts are packed round-robin by rank, so every question gets its
+        best passage in before any gets its second, and a passage retrieved
+        for several questions is sent once. Returns the prompt and the
+        contexts that made it in for each question.
+        """
+        template = self._answers_template(questions, [[] for _ in questions], [])
+        budget = self.packer.budget(DEFAULT_MODEL, template, self.batch_answer_tokens * len(questions),
+                                    cap=self.answer_context_tokens * len(questions))
+        excerpts: List[str] = []
+        numbers: Dict[str, int] = {}
+        contexts_used: List[List[str]] = [[] for _ in questions]
+        used_tokens = 0
+        for rank in range(max((len(contexts) for contexts in contexts_per_question), default=0)):
+            for i, contexts in enumerate(contexts_per_question):
+                if rank >= len(contexts):
+                    continue
+                context = contexts[rank]
+                if context not in numbers:
+                    cost = self.packer.counter.count(context)
+                    if used_tokens + cost > budget:
+                        continue
+                    used_tokens += cost
+                    excerpts.append(context)
+                    numbers[context] = len(excerpts)
+                contexts_used[i].append(context)
+
+        if not excerpts:
+            excerpts = [self.packer.truncate(document_content, budget)]
+        references = [[numbers[context] for context in contexts] for contexts in contexts_used]
+        return self._answers_template(questions, references, excerpts), contexts_used
+
+    def _answers_template(self, questions: List[str], references: List[List[int]], excerpts: List[str]) -> str:
+        excerpt_text = "\n\n".join(f"[{number}] {excerpt}" for number, excerpt in enumerate(excerpts, start=1))
+        question_lines = []
+        for number, (question, refs) in enumerate(zip(questions, references), start=1):
+            see = f" (see excerpts {', '.join(map(str, refs))})" if refs else ""
+            question_lines.append(f"{number}. {question}{see}")
+        question_text = "\n        ".join(question_lines)
+        return f"""
+        Answer each question below using the numbered document excerpts. Every answer 
+        must be grounded in the excerpts and come with a justification naming the 
+        excerpt or passage that supports it. If an answer cannot be found in the 
+        excerpts, clearly state that.
+        
+        Document Excerpts:
+        {excerpt_text}
+        
+        Questions:
+        {question_text}
+        
+        Respond with a JSON object with one entry per question, using the question's number as id:
+        {{"answers": [{{"id": 1, "answer": "A clear, direct answer", "justification": "Supporting excerpt or passage"}}]}}
+        """
+
+    def parse_answers(self, reply: str, contexts_used: List[List[str]]) -> List[Dict]:
+        """Validate a batched answer reply into answer_question-style dicts"""
+        items = validate_items(parse_json_object(reply), 'answers', len(contexts_used),
+                               required=('answer',), optional=('justification',))
+        return [
+            {
+                'answer': item['answer'],
+                'justification': item['justification'] or "Based on document analysis",
+                'contexts_used': contexts
             }
+            for item, contexts in zip(items, contexts_used)
+        ]
+
+    @staticmethod
+    def answer_error(error: Exception) -> Dict:
+        return {
+            'answer': f"Error processing question: {str(error)}",
+            'justification': "Error in AI processing",
+            'contexts_used': []
+        }
+
+    @staticmethod
+    def is_answer_error(result: Dict) -> bool:
+        """Whether an answer dict reports a failed call (see answer_error) rather than an answer"""
+        return result['answer'].startswith("Error processing question")
+
+    @staticmethod
+    def is_summary_error(summary: str) -> bool:
+        return summary.startswith("Error generating summary")
+
+    def answer_questions(self, questions: List[str], document_content: str,
+                         contexts_per_question: List[List[str]], use_cache: bool = True) -> List[Dict]:
+        """Answer several questions about a document with one completion per batch
+
+        Returns answer_question-style dicts in question order. A batch whose
+        reply does not validate is split in half and each half is retried; a
+        single question is always asked with answer_question.
+        """
+        def run(batch: range) -> List[Dict]:
+            return self._answer_batch([questions[i] for i in batch], document_content,
+                                      [contexts_per_question[i] for i in batch], use_cache)
+
+        batches = self.batches(len(questions), self.answer_batch_size)
+        return [result for results in self._map(run, batches) for result in results]
+
+    def _answer_batch(self, questions: List[str], document_content: str,
+                      contexts_per_question: List[List[str]], use_cache: bool) -> List[Dict]:
+        if len(questions) == 1:
+            return [self.answer_question(questions[0], document_content, contexts_per_question[0],
+                                         use_cache=use_cache)]
+
+        prompt, contexts_used = self.build_answers_prompt(questions, document_content, contexts_per_question)
+        try:
+            reply = self._complete(prompt, max_tokens=self.batch_answer_tokens * len(questions), temperature=0.2,
+                                   use_cache=use_cache, task='answer_batch', response_format=JSON_RESPONSE_FORMAT,
+                                   validate=lambda reply: self.parse_answers(reply, contexts_used))
+            return self.parse_answers(reply, contexts_used)
+        except Exception as e:
+            if not should_split(e):
+                return [self.answer_error(e) for _ in questions]
+        self.batch_splits += 1
+        middle = len(questions) // 2
+        return (self._answer_batch(questions[:middle], document_content, contexts_per_question[:middle], use_cache)
+                + self._answer_batch(questions[middle:], document_content, contexts_per_question[middle:], use_cache))
+
+    def build_evaluations_prompt(self, items: List[Dict], document_content: str) -> str:
+        """JSON-mode prompt grading several answers against one copy of the document"""
+        template = self._evaluations_template(items, "")
+        budget = self.packer.budget(DEFAULT_MODEL, template, self.batch_evaluation_tokens * len(items),
+                                    cap=self.evaluation_context_tokens)
+        return self._evaluations_template(items, self.packer.truncate(document_content, budget))
+
+    def _evaluations_template(self, items: List[Dict], document_text: str) -> str:
+        answers_text = "\n\n        ".join(
+            f"{number}. Question: {item['question']}\n"
+            f"        Expected Answer: {item['expected_answer']}\n"
+            f"        User's Answer: {item['user_answer']}"
+            for number, item in enumerate(items, start=1)
+        )
+        return f"""
+        A user was asked questions about a document and provided answers. 
+        Please evaluate each answer and provide feedback.
+        
+        Document Context:
+        {document_text}
+        
+        Answers to evaluate:
+        {answers_text}
+        
+        For each answer, give a score ({"/".join(EVALUATION_SCORES)}), specific feedback on what 
+        was correct/incorrect, and the correct answer with a document reference.
+        
+        Respond with a JSON object with one entry per answer, using the answer's number as id:
+        {{"evaluations": [{{"id": 1, "score": "Good", "feedback": "Detailed feedback", "correct_answer": "Correct answer with document reference"}}]}}
+        """
+
+    def parse_evaluations(self, reply: str, items: List[Dict]) -> List[Dict]:
+        """Validate a batched evaluation reply into evaluate_answer-style dicts"""
+        evaluations = validate_items(parse_json_object(reply), 'evaluations', len(items),
+                                     required=('score', 'feedback'), optional=('correct_answer',),
+                                     choices={'score': EVALUATION_SCORES})
+        for evaluation, item in zip(evaluations, items):
+            evaluation['correct_answer'] = evaluation['correct_answer'] or item['expected_answer']
+        return evaluations
+
+    def evaluate_answers(self, items: List[Dict], document_content: str, use_cache: bool = True) -> List[Dict]:
+        """Grade several answers with one completion per batch
+
+        Each item has question, expected_answer and user_answer. Returns
+        evaluate_answer-style dicts in the same order, splitting batches
+        whose reply does not validate like answer_questions does.
+        """
+        def run(batch: range) -> List[Dict]:
+            return self._evaluate_batch([items[i] for i in batch], document_content, use_cache)
+
+        batches = self.batches(len(items), self.evaluation_batch_size)
+        return [result for results in self._map(run, batches) for result in results]
+
+    def _evaluate_batch(self, items: List[Dict], document_content: str, use_cache: bool) -> List[Dict]:
+        if len(items) == 1:
+            item = items[0]
+            return [self.evaluate_answer(item['user_answer'], item['question'], item['expected_answer'],
+                                         document_content, use_cache=use_cache)]
+
+        prompt = self.build_evaluations_prompt(items, document_content)
+        try:
+            reply = self._complete(prompt, max_tokens=self.batch_evaluation_tokens * len(items), temperature=0.3,
+                                   use_cache=use_cache, task='evaluation_batch', response_format=JSON_RESPONSE_FORMAT,
+                                   validate=lambda reply: self.parse_evaluations(reply, items))
+            return self.parse_evaluations(reply, items)
+        except Exception as e:
+            if not should_split(e):
+                return [self.evaluation_error(e, item['expected_answer']) for item in items]
+        self.batch_splits += 1
+        middle = len(items) // 2
+        return (self._evaluate_batch(items[:middle], document_content, use_cache)
+                + self._evaluate_batch(items[middle:], document_content, use_cache))
+
+    @staticmethod
+    def evaluation_error(error: Exception, expected_answer: str) -> Dict:
+        return {
+            'score': "Error",
+            'feedback': f"Error evaluating answer: {str(error)}",
+            'correct_answer': expected_answer
+        }
@@ -1,8 +1,16 @@
 import streamlit as st
+import importlib.util
 import os
-import tempfile
+import time
+from corpus import Corpus
+from document import Document
+from document_cache import DocumentCache
 from document_processor import DocumentProcessor
-from ai_assistant import AIAssistant
+from async_assistant import AsyncAIAssistant, PostUploadTasks
+from metrics import metrics, serve_metrics
+from processing_jobs import JobCancelled, JobManager, ProcessingJob, save_upload
+from response_cache import ResponseCache
+from shared_store import DocumentHandle, SharedDocumentStore
 
 # Configure Streamlit page
 st.set_page_config(
@@ -12,19 +20,85 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# Process-wide resources shared by every session: one Groq client and
+# response cache, one processor, and one copy of each processed document
+@st.cache_resource
+def get_assistant() -> AsyncAIAssistant:
+    llm_cache_ttl = os.getenv("LLM_CACHE_TTL")
+    return AsyncAIAssistant(
+        cache=ResponseCache(
+            db_path=os.getenv("LLM_CACHE_DB"),
+            ttl_seconds=float(llm_cache_ttl) if llm_cache_ttl else None
+        )
+    )
+
+@st.cache_resource
+def get_processor() -> DocumentProcessor:
+    return DocumentProcessor(
+        retrieval_mode=os.getenv("RETRIEVAL_MODE", "bm25"),
+        tokenizer_mode=os.getenv("TOKENIZER_MODE", "punkt"),
+        chunk_chars=int(os.getenv("CHUNK_CHARS", 400)),
+        chunk_overlap=int(os.getenv("CHUNK_OVERLAP", 80)),
+        cache=DocumentCache()
+    )
+
+@st.cache_resource
+def get_document_store() -> SharedDocumentStore:
+    return SharedDocumentStore()
+
+@st.cache_resource
+def get_job_manager() -> JobManager:
+    return JobManager()
+
+@st.cache_resource
+def get_semantic_cache():
+    # The sentence embedder matches by meaning but is only used when embedding
+    # retrieval already needs it; otherwise questions must share their content
+    # words, which needs no model download
+    from semantic_cache import SemanticAnswerCache
+    processor = get_processor()
+    encoder = None
+    if processor.retrieval_mode == 'embedding' and importlib.util.find_spec('sentence_transformers'):
+        encoder = processor.embedder
+    return SemanticAnswerCache(encoder=encoder)
+
+def active_document() -> Document:
+    """The session's current document, read through its shared-store handle"""
+    return st.session_state.document_handles[st.session_state.active_document_id].document
+
 # Initialize session state
 if 'document_processed' not in st.session_state:
     st.session_state.document_processed = False
-if 'document_data' not in st.session_state:
-    st.session_state.document_data = None
 if 'assistant' not in st.session_state:
-    st.session_state.assistant = AIAssistant()
+    st.session_state.assistant = get_assistant()
 if 'processor' not in st.session_state:
-    st.session_state.processor = DocumentProcessor()
+    st.session_state.processor = get_processor()
+if 'document_handles' not in st.session_state:
+    st.session_state.document_handles = {}
+if 'corpus' not in st.session_state:
+    st.session_state.corpus = Corpus(st.session_state.processor)
+if 'active_document_id' not in st.session_state:
+    st.session_state.active_document_id = None
 if 'challenge_questions' not in st.session_state:
     st.session_state.challenge_questions = []
 if 'current_question_idx' not in st.session_state:
     st.session_state.current_question_idx = 0
+if 'challenge_answers' not in st.session_state:
+    # Answers typed so far, by question index; the round keeps widget keys unique per question set
+    st.session_state.challenge_answers = {}
+    st.session_state.challenge_round = 0
+if 'post_upload_tasks' not in st.session_state:
+    st.session_state.post_upload_tasks = None
+if 'processing_job_id' not in st.session_state:
+    st.session_state.processing_job_id = None
+
+@st.cache_resource
+def start_metrics_server(port: int):
+    """Start the Prometheus endpoint once per process, not once per session"""
+    return serve_metrics(port)
+
+if os.getenv("METRICS_PORT"):
+    start_metrics_server(int(os.getenv("METRICS_PORT")))
 
 def main():
     st.title("🔍 Smart Research Assistant")
@@ -40,17 +114,72 @@ def main():
             help="Upload a structured document like a research paper, report, or manual"
         )
         
+        job_progress = None
         if uploaded_file is not None:
-            if st.button("Process Document", type="primary"):
+            if st.button("Process Document", type="primary",
+                         disabled=st.session_state.processing_job_id is not None):
                 process_document(uploaded_file)
         
+        if st.session_state.processing_job_id is not None:
+            job_progress = show_processing_job()
+        
         # Document info
         if st.session_state.document_processed:
             st.success("✅ Document processed successfully!")
-            doc_data = st.session_state.document_data
-            st.write(f"**Word Count:** {doc_data['word_count']}")
-            st.write(f"**Sentences:** {doc_data['sentence_count']}")
-            st.write(f"**Paragraphs:** {len(doc_data['paragraphs'])}")
+            doc_data = active_document()
+            st.write(f"**Word Count:** {doc_data.word_count}")
+            st.write(f"**Sentences:** {doc_data.sentence_count}")
+            st.write(f"**Paragraphs:** {doc_data.paragraph_count}")
+            st.write(f"**Retrieval chunks:** {doc_data.chunk_count}")
+        
+        # Every processed document stays in the library for cross-document questions
+        corpus = st.session_state.corpus
+        if len(corpus) > 0:
+            st.header("📚 Library")
+            for doc_id in corpus.ids():
+                col1, col2 = st.columns([4, 1])
+                col1.write(corpus.name(doc_id))
+                if doc_id != st.session_state.active_document_id:
+                    if col2.button("✖", key=f"remove_{doc_id}", help="Remove from library"):
+                        corpus.remove(doc_id)
+                        st.session_state.document_handles.pop(doc_id).release()
+                        st.rerun()
+        
+        # Per-stage latency, token and cache metrics
+        with st.expander("🛠 Debug: Performance Metrics"):
+            rows = metrics.snapshot()
+            if rows:
+                st.dataframe(rows, hide_index=True)
+            else:
+                st.caption("No metrics recorded yet")
+            store_stats = get_document_store().stats
+            st.caption(
+                f"Shared document store: {store_stats['documents']} documents "
+                f"({store_stats['referenced']} in use), {store_stats['mb']} MB, "
+                f"{store_stats['hits']} hits / {store_stats['misses']} misses"
+            )
+            transport_stats = st.session_state.assistant.transport.stats
+            st.caption(
+                f"Groq transport: circuit {transport_stats['breaker']}, {transport_stats['retries']} retries, "
+                f"{transport_stats['hedges']} hedged ({transport_stats['hedge_wins']} won by the hedge)"
+            )
+            job_stats = get_job_manager().stats
+            st.caption(
+                f"Processing jobs: {job_stats['running']} running, {job_stats['queued']} queued"
+            )
+            decisions = st.session_state.assistant.router.recent(10)
+            if decisions:
+                st.caption("Recent model routing decisions")
+                st.dataframe(decisions, hide_index=True)
+            st.download_button(
+                "Download Prometheus metrics",
+                data=metrics.to_prometheus(),
+                file_name="metrics.prom",
+                mime="text/plain"
+            )
+            if st.button("Reset metrics"):
+                metrics.reset()
+                st.rerun()
     
     # Main content area
     if not st.session_state.document_processed:
@@ -72,13 +201,26 @@ def main():
         # Display document summary
         st.subheader("📋 Document Summary")
         if 'summary' not in st.session_state:
-            with st.spinner("Generating summary..."):
-                summary = st.session_state.assistant.generate_summary(
-                    st.session_state.document_data['cleaned_text']
-                )
-                st.session_state.summary = summary
-        
-        st.write(st.session_state.summary)
+            # Render tokens as they stream in instead of waiting for the whole summary
+            summary_placeholder = st.empty()
+            tasks = st.session_state.post_upload_tasks
+            if tasks is not None and not tasks.summary_future.cancelled():
+                # Already being generated in the background alongside the challenge questions
+                while not tasks.summary_future.done():
+                    summary_placeholder.write(tasks.summary_so_far() or "Generating summary...")
+                    time.sleep(0.05)
+                summary = tasks.summary_future.result()
+                summary_placeholder.write(summary)
+            else:
+                summary = ""
+                for delta in st.session_state.assistant.stream_summary(
+                    active_document().cleaned_text
+                ):
+                    summary += delta
+                    summary_placeholder.write(summary)
+            st.session_state.summary = summary.strip()
+        else:
+            st.write(st.session_state.summary)
         
         # Interaction modes
         st.subheader("🎯 Choose Your Interaction Mode")
@@ -93,30 +235,138 @@ def main():
             ask_anything_mode()
         else:
             challenge_mode()
+    
+    if job_progress is not None:
+        wait_for_processing_job(job_progress)
+
+# Progress bar position and label as each processing stage starts; PDF page
+# extraction fills the bar up to the 'clean' stage
+STAGE_PROGRESS = {
+    'extract': (0.0, "Extracting text..."),
+    'clean': (0.8, "Cleaning text..."),
+    'tokenize': (0.85, "Splitting sentences..."),
+    'chunk': (0.9, "Chunking paragraphs..."),
+    'index': (0.93, "Building search index..."),
+    'embed': (0.96, "Embedding sentences...")
+}
 
 def process_document(uploaded_file):
-    """Process uploaded document"""
+    """Copy the upload to disk and start processing it in the background"""
     try:
-        # Save uploaded file temporarily
-        with tempfile.NamedTemporaryFile(delete=False, suffix=f".{uploaded_file.name.split('.')[-1]}") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            tmp_file_path = tmp_file.name
-        
-        # Process document
-        with st.spinner("Processing document..."):
-            document_data = st.session_state.processor.process_document(tmp_file_path)
-            st.session_state.document_data = document_data
-            st.session_state.document_processed = True
+        # Copied in chunks and hashed on the way instead of via getvalue()
+        with st.spinner("Saving upload..."):
+            tmp_file_path, digest = save_upload(uploaded_file, os.path.splitext(uploaded_file.name)[1])
         
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
-        
-        st.success("Document processed successfully!")
+        processor = st.session_state.processor
+        store = get_document_store()
+        key = f"{digest}-{processor.cache_namespace}"
+        job = get_job_manager().submit(
+            uploaded_file.name,
+            lambda job: load_document(job, processor, store, tmp_file_path, key)
+        )
+        st.session_state.processing_job_id = job.job_id
         st.rerun()
         
     except Exception as e:
         st.error(f"Error processing document: {str(e)}")
 
+def load_document(job: ProcessingJob, processor: DocumentProcessor, store: SharedDocumentStore,
+                  file_path: str, key: str) -> DocumentHandle:
+    """Worker side of a processing job; runs without a Streamlit session"""
+    def report_pages(pages_done, total_pages):
+        job.check_cancelled()
+        job.report(f"Extracted page {pages_done} of {total_pages}",
+                   STAGE_PROGRESS['clean'][0] * pages_done / total_pages)
+    
+    def report_stage(stage):
+        job.check_cancelled()
+        job.report(STAGE_PROGRESS[stage][1], STAGE_PROGRESS[stage][0])
+    
+    try:
+        # Another session may already have processed the same file
+        return store.acquire(
+            key,
+            lambda: processor.process_document(file_path, progress_callback=report_pages,
+                                               stage_callback=report_stage)
+        )
+    finally:
+        os.unlink(file_path)
+
+def show_processing_job():
+    """Progress bar and cancel button for the session's processing job
+    
+    Returns the progress placeholder, which main() keeps updating until the
+    job is done, or None if there is no job left to wait for.
+    """
+    manager = get_job_manager()
+    job = manager.get(st.session_state.processing_job_id)
+    if job is None:
+        st.session_state.processing_job_id = None
+        st.warning("Processing was interrupted, please process the document again")
+        return None
+    
+    progress = st.empty()
+    progress.progress(job.fraction, text=f"{job.name}: {job.stage}")
+    if st.button("Cancel processing"):
+        # The worker stops at its next page or stage and drops the job
+        job.cancel()
+        manager.pop(job.job_id)
+        st.session_state.processing_job_id = None
+        progress.empty()
+        st.info("Processing cancelled")
+        return None
+    return progress
+
+def wait_for_processing_job(progress):
+    """Update the progress bar until the job is done, then open its document
+    
+    Runs at the end of the script so the rest of the page stays usable; a
+    click anywhere (including Cancel) stops this run and starts a new one.
+    """
+    manager = get_job_manager()
+    job = manager.get(st.session_state.processing_job_id)
+    while not job.done:
+        progress.progress(job.fraction, text=f"{job.name}: {job.stage}")
+        time.sleep(0.25)
+    
+    # Forget the job so the finished handle belongs to this session alone
+    manager.pop(job.job_id)
+    st.session_state.processing_job_id = None
+    progress.empty()
+    try:
+        handle = job.result()
+    except JobCancelled:
+        st.sidebar.info("Processing cancelled")
+        return
+    except Exception as e:
+        st.sidebar.error(f"Error processing document: {str(e)}")
+        return
+    open_document(job.name, handle)
+    st.rerun()
+
+def open_document(doc_id: str, handle: DocumentHandle):
+    """Make a processed document the session's active one"""
+    previous = st.session_state.document_handles.pop(doc_id, None)
+    if previous is not None:
+        previous.release()
+    st.session_state.document_handles[doc_id] = handle
+    st.session_state.corpus.add(doc_id, handle.document)
+    st.session_state.active_document_id = doc_id
+    st.session_state.document_processed = True
+    
+    # Drop everything derived from the previous document and start the
+    # summary and challenge questions for this one concurrently
+    if st.session_state.post_upload_tasks is not None:
+        st.session_state.post_upload_tasks.cancel()
+    st.session_state.pop('summary', None)
+    st.session_state.challenge_questions = []
+    st.session_state.current_question_idx = 0
+    reset_challenge_answers()
+    st.session_state.post_upload_tasks = PostUploadTasks(
+        st.session_state.assistant,
+        handle.document.cleaned_text
+    )
+
 def ask_anything_mode():
     """Ask Anything interaction mode"""
     st.markdown("### 💬 Ask Anything Mode")
@@ -127,49 +377,98 @@ def ask_anything_mode():
         placeholder="e.g., What are the main findings of this research?"
     )
     
+    corpus = st.session_state.corpus
+    search_library = False
+    if len(corpus) > 1:
+        search_library = st.checkbox(f"Search the whole library ({len(corpus)} documents)")
+    reuse_answers = st.checkbox("Reuse answers to similar questions", value=True)
+    
     if st.button("Get Answer") and question:
-        with st.spinner("Analyzing document and generating answer..."):
-            # Find relevant context
-            relevant_contexts = st.session_state.processor.find_relevant_context(
-                st.session_state.document_data['cleaned_text'],
-                question
-            )
-            
-            # Get answer from AI
-            result = st.session_state.assistant.answer_question(
-                question,
-                st.session_state.document_data['cleaned_text'],
-                relevant_contexts
-            )
-            
-            # Display answer
+        # Keyed by content, so answers are shared with other sessions on the same documents
+        semantic_cache = get_semantic_cache()
+        handles = st.session_state.document_handles
+        if search_library:
+            cache_key = semantic_cache.library_key([handle.key for handle in handles.values()])
+        else:
+            cache_key = handles[st.session_state.active_document_id].key
+        
+        hit = semantic_cache.lookup(cache_key, question) if reuse_answers else None
+        if hit is not None:
+            st.caption(f"♻️ {hit.explain()}")
             st.markdown("#### 🎯 Answer")
-            st.write(result['answer'])
-            
+            st.write(hit.result['answer'])
             st.markdown("#### 📚 Justification")
-            st.write(result['justification'])
-            
-            # Show relevant contexts if available
-            if result['contexts_used']:
-                with st.expander("📄 Source Context"):
-                    for i, context in enumerate(result['contexts_used']):
-                        st.markdown(f"**Context {i+1}:**")
-                        st.write(context)
-                        st.markdown("---")
+            st.write(hit.result['justification'])
+            show_source_contexts(hit.result['contexts_used'])
+            return
+        
+        with st.spinner("Finding relevant context..."):
+            # Find relevant context
+            if search_library:
+                relevant_contexts = corpus.find_relevant_context(question)
+            else:
+                relevant_contexts = st.session_state.processor.find_relevant_context(
+                    active_document(),
+                    question
+                )
+        
+        # Stream the answer from AI, updating both sections as text arrives
+        st.markdown("#### 🎯 Answer")
+        answer_placeholder = st.empty()
+        st.markdown("#### 📚 Justification")
+        justification_placeholder = st.empty()
+        
+        result = None
+        for result in st.session_state.assistant.stream_answer(
+            question,
+            active_document().cleaned_text,
+            relevant_contexts
+        ):
+            answer_placeholder.write(result['answer'] or "…")
+            justification_placeholder.write(result['justification'] or "…")
+        
+        if result is not None:
+            # Failed answers are not worth reusing
+            if reuse_answers and not st.session_state.assistant.is_answer_error(result):
+                semantic_cache.store(cache_key, question, result)
+            show_source_contexts(result['contexts_used'])
+
+def show_source_contexts(contexts):
+    # Show relevant contexts if available
+    if contexts:
+        with st.expander("📄 Source Context"):
+            for i, context in enumerate(contexts):
+                st.markdown(f"**Context {i+1}:**")
+                st.write(context)
+                st.markdown("---")
 
 def challenge_mode():
     """Challenge Me interaction mode"""
     st.markdown("### 🧠 Challenge Me Mode")
     st.write("Test your understanding with AI-generated questions based on your document.")
     
+    # Pick up questions prefetched after upload as soon as they are ready
+    tasks = st.session_state.post_upload_tasks
+    if not st.session_state.challenge_questions and tasks is not None and tasks.questions_ready:
+        st.session_state.challenge_questions = tasks.take_questions()
+    
     # Generate questions if not already generated
     if not st.session_state.challenge_questions:
         if st.button("Generate Challenge Questions", type="primary"):
             with st.spinner("Generating challenge questions..."):
-                questions = st.session_state.assistant.generate_challenge_questions(
-                    st.session_state.document_data['cleaned_text']
-                )
+                prefetched = None
+                if tasks is not None and not st.session_state.get('refresh_questions', False):
+                    prefetched = tasks.take_questions()
+                if prefetched is not None:
+                    questions = prefetched
+                else:
+                    # After "Generate New Questions" the cached set must not be reused
+                    questions = st.session_state.assistant.generate_challenge_questions(
+                        active_document().cleaned_text,
+                        use_cache=not st.session_state.get('refresh_questions', False)
+                    )
                 st.session_state.challenge_questions = questions
+                st.session_state.refresh_questions = False
                 st.rerun()
     
     # Display questions if available
@@ -193,48 +492,86 @@ def challenge_mode():
                 st.rerun()
         
         # Current question
-        current_q = st.session_state.challenge_questions[st.session_state.current_question_idx]
+        idx = st.session_state.current_question_idx
+        current_q = st.session_state.challenge_questions[idx]
         st.markdown(f"**Question:** {current_q['question']}")
         
-        # User answer input
+        # User answer input, kept per question so it survives navigation
+        answers = st.session_state.challenge_answers
         user_answer = st.text_area(
             "Your answer:",
+            value=answers.get(idx, ""),
+            key=f"challenge_answer_{st.session_state.challenge_round}_{idx}",
             height=100,
             placeholder="Type your answer here..."
         )
+        answers[idx] = user_answer
+        answered = [i for i, answer in sorted(answers.items()) if answer.strip()]
         
-        if st.button("Submit Answer") and user_answer:
+        col1, col2 = st.columns(2)
+        with col1:
+            submit_one = st.button("Submit Answer")
+        with col2:
+            # Every answer is graded in a single call
+            submit_all = len(answered) > 1 and st.button(f"Grade All {len(answered)} Answers")
+        
+        if submit_one and user_answer:
             with st.spinner("Evaluating your answer..."):
                 evaluation = st.session_state.assistant.evaluate_answer(
                     user_answer,
                     current_q['question'],
                     current_q['expected_answer'],
-                    st.session_state.document_data['cleaned_text']
+                    active_document().cleaned_text
                 )
-                
-                # Display evaluation
-                st.markdown("#### 📊 Evaluation")
-                
-                # Score with color coding
-                score = evaluation['score']
-                if score.lower() in ['excellent', 'good']:
-                    st.success(f"Score: {score}")
-                elif score.lower() == 'fair':
-                    st.warning(f"Score: {score}")
-                else:
-                    st.error(f"Score: {score}")
-                
-                st.markdown("#### 💬 Feedback")
-                st.write(evaluation['feedback'])
-                
-                st.markdown("#### ✅ Correct Answer")
-                st.write(evaluation['correct_answer'])
+                show_evaluation(evaluation)
+        elif submit_all:
+            questions = st.session_state.challenge_questions
+            with st.spinner("Evaluating your answers..."):
+                evaluations = st.session_state.assistant.evaluate_answers(
+                    [
+                        {
+                            'question': questions[i]['question'],
+                            'expected_answer': questions[i]['expected_answer'],
+                            'user_answer': answers[i]
+                        }
+                        for i in answered
+                    ],
+                    active_document().cleaned_text
+                )
+            for i, evaluation in zip(answered, evaluations):
+                st.markdown(f"### Question {i + 1}: {questions[i]['question']}")
+                show_evaluation(evaluation)
         
         # Reset questions button
         if st.button("🔄 Generate New Questions"):
             st.session_state.challenge_questions = []
             st.session_state.current_question_idx = 0
+            reset_challenge_answers()
+            st.session_state.refresh_questions = True
             st.rerun()
 
+def reset_challenge_answers():
+    st.session_state.challenge_answers = {}
+    st.session_state.challenge_round += 1
+
+def show_evaluation(evaluation):
+    # Display evaluation
+    st.markdown("#### 📊 Evaluation")
+    
+    # Score with color coding
+    score = evaluation['score']
+    if score.lower() in ['excellent', 'good']:
+        st.success(f"Score: {score}")
+    elif score.lower() == 'fair':
+        st.warning(f"Score: {score}")
+    else:
+        st.error(f"Score: {score}")
+    
+    st.markdown("#### 💬 Feedback")
+    st.write(evaluation['feedback'])
+    
+    st.markdown("#### ✅ Correct Answer")
+    st.write(evaluation['correct_answer'])
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,321 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from typing import AsyncIterator, Callable, Coroutine, Dict, List, Optional
+
+from ai_assistant import AIAssistant, groq_api_key
+from context_packer import ContextPacker
+from groq_transport import GroqTransport
+from metrics import metrics
+from model_router import ModelRouter
+from rate_limiter import RequestScheduler
+from response_cache import ResponseCache
+from structured_output import JSON_RESPONSE_FORMAT, should_split
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Process-wide event loop running in a daemon thread"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="assistant-event-loop", daemon=True).start()
+        return _loop
+
+
+def run_in_background(coro: Coroutine) -> Future:
+    """Schedule a coroutine on the background loop; cancelling the Future cancels the task"""
+    return asyncio.run_coroutine_threadsafe(coro, background_loop())
+
+
+class AsyncAIAssistant(AIAssistant):
+    """AIAssistant with asyncio counterparts built on the SDK's AsyncGroq client
+
+    Prompts, parsing and the response cache are shared with the blocking
+    methods, so a result produced by either path is a cache hit for the other.
+    """
+
+    def __init__(self, cache: ResponseCache = None, scheduler: RequestScheduler = None,
+                 packer: ContextPacker = None, transport: GroqTransport = None, router: ModelRouter = None):
+        if transport is None:
+            # With a scheduler, retries and rate limits are its job rather than the transport's
+            api_key = groq_api_key()
+            transport = (GroqTransport(api_key=api_key, max_retries=0) if scheduler is not None
+                         else GroqTransport(api_key=api_key))
+        super().__init__(cache=cache, packer=packer, transport=transport, router=router)
+        self.scheduler = scheduler
+
+    @property
+    def async_client(self):
+        return self.transport.async_client
+
+    async def _complete_async(self, prompt: str, max_tokens: int, temperature: float,
+                              model: Optional[str] = None, use_cache: bool = True,
+                              task: str = 'completion', response_format: Dict = None,
+                              validate: Callable[[str], object] = None) -> str:
+        stage = f"llm.{task}"
+        key = self._cache_key(task, model, temperature, max_tokens, prompt)
+        if use_cache:
+            cached = self.cache.get(key)
+            metrics.record_cache(stage, cached is not None)
+            if cached is not None:
+                return cached
+
+        async def call(model_name: str, deadline: Optional[float]):
+            request = self.completion_request(prompt, max_tokens, temperature, model_name, response_format)
+
+            def send():
+                return self.transport.acreate(deadline=deadline, **request)
+
+            if self.scheduler is not None:
+                estimated_tokens = self.packer.counter.count(prompt) + max_tokens
+                return await self.scheduler.run(send, estimated_tokens=estimated_tokens)
+            return await send()
+
+        with metrics.timer(stage):
+            _, response = await self.router.complete_async(task, call, self._reply_check(validate), model=model)
+        metrics.record_usage(stage, response)
+        content = response.choices[0].message.content.strip()
+        self.cache.put(key, content)
+        return content
+
+    async def _stream_complete_async(self, prompt: str, max_tokens: int, temperature: float,
+                                     model: Optional[str] = None, use_cache: bool = True,
+                                     task: str = 'completion') -> AsyncIterator[str]:
+        stage = f"llm.{task}"
+        key = self._cache_key(task, model, temperature, max_tokens, prompt)
+        if use_cache:
+            cached = self.cache.get(key)
+            metrics.record_cache(stage, cached is not None)
+            if cached is not None:
+                yield cached
+                return
+
+        start = time.perf_counter()
+        parts = []
+        try:
+            def open_stream(model_name: str, deadline: Optional[float]):
+                return self.transport.astream(
+                    deadline=deadline,
+                    model=model_name,
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+
+            async for chunk in self.router.stream_async(task, open_stream, model=model):
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    if not parts:
+                        metrics.observe(f"{stage}.first_token", time.perf_counter() - start)
+                    parts.append(delta)
+                    yield delta
+        except Exception:
+            metrics.observe(stage, time.perf_counter() - start, error=True)
+            raise
+        metrics.observe(stage, time.perf_counter() - start)
+        # Streamed chunks carry no usage block, so estimate with the packer's counter
+        metrics.record_tokens(stage, self.packer.counter.count(prompt), self.packer.counter.count("".join(parts)))
+
+        self.cache.put(key, "".join(parts).strip())
+
+    async def _complete_many_async(self, prompts: List[str], max_tokens: int, temperature: float,
+                                   use_cache: bool = True, task: str = 'completion') -> List[str]:
+        semaphore = asyncio.Semaphore(self.map_concurrency)
+
+        async def complete(prompt: str) -> str:
+            async with semaphore:
+                return await self._complete_async(prompt, max_tokens, temperature, use_cache=use_cache,
+                                                  task=task)
+
+        return list(await asyncio.gather(*(complete(prompt) for prompt in prompts)))
+
+    async def final_summary_prompt_async(self, document_content: str, use_cache: bool = True) -> str:
+        """Async counterpart of final_summary_prompt"""
+        sections = self.summary_sections(document_content)
+        if len(sections) == 1:
+            return self.build_summary_prompt(sections[0])
+
+        summaries = await self._complete_many_async(
+            [self._section_summary_template(section) for section in sections],
+            max_tokens=200, temperature=0.3, use_cache=use_cache, task='section_summary'
+        )
+        groups = self.group_for_merge(summaries)
+        while len(groups) > 1:
+            summaries = await self._complete_many_async(
+                [self.build_merge_prompt(group) for group in groups],
+                max_tokens=200, temperature=0.3, use_cache=use_cache, task='merge_summary'
+            )
+            groups = self.group_for_merge(summaries)
+        return self.build_merge_prompt(groups[0])
+
+    async def generate_summary_async(self, document_content: str, use_cache: bool = True) -> str:
+        try:
+            prompt = await self.final_summary_prompt_async(document_content, use_cache=use_cache)
+            return await self._complete_async(prompt, max_tokens=200, temperature=0.3,
+                                              use_cache=use_cache, task='summary')
+        except Exception as e:
+            return f"Error generating summary: {str(e)}"
+
+    async def stream_summary_async(self, document_content: str, use_cache: bool = True) -> AsyncIterator[str]:
+        try:
+            prompt = await self.final_summary_prompt_async(document_content, use_cache=use_cache)
+            async for delta in self._stream_complete_async(prompt, max_tokens=200, temperature=0.3,
+                                                           use_cache=use_cache, task='summary'):
+                yield delta
+        except Exception as e:
+            yield f"Error generating summary: {str(e)}"
+
+    async def answer_question_async(self, question: str, document_content: str, relevant_contexts: List[str],
+                                    use_cache: bool = True) -> Dict:
+        prompt = self.build_answer_prompt(question, document_content, relevant_contexts)
+        try:
+            full_response = await self._complete_async(prompt, max_tokens=400, temperature=0.2,
+                                                       use_cache=use_cache, task='answer',
+                                                       validate=self.validate_answer)
+            return self.parse_answer(full_response, relevant_contexts)
+        except Exception as e:
+            return self.answer_error(e)
+
+    async def generate_challenge_questions_async(self, document_content: str,
+                                                 use_cache: bool = True) -> List[Dict]:
+        prompt = self.build_challenge_prompt(document_content)
+        try:
+            questions_text = await self._complete_async(prompt, max_tokens=600, temperature=0.4,
+                                                        use_cache=use_cache, task='challenge',
+                                                        response_format=JSON_RESPONSE_FORMAT,
+                                                        validate=self.validate_challenge)
+            return self.parse_challenge_response(questions_text)
+        except Exception as e:
+            return [
+                {
+                    'question': f"Error generating questions: {str(e)}",
+                    'expected_answer': "Error in processing"
+                }
+            ]
+
+    async def evaluate_answer_async(self, user_answer: str, question: str, expected_answer: str,
+                                    document_content: str, use_cache: bool = True) -> Dict:
+        prompt = self.build_evaluation_prompt(user_answer, question, expected_answer, document_content)
+        try:
+            evaluation = await self._complete_async(prompt, max_tokens=300, temperature=0.3,
+                                                    use_cache=use_cache, task='evaluation',
+                                                    validate=self.validate_evaluation)
+            return self.parse_evaluation(evaluation, expected_answer)
+        except Exception as e:
+            return self.evaluation_error(e, expected_answer)
+
+    async def answer_questions_async(self, questions: List[str], document_content: str,
+                                     contexts_per_question: List[List[str]], use_cache: bool = True) -> List[Dict]:
+        """Async counterpart of answer_questions; batches go out concurrently"""
+        batches = self.batches(len(questions), self.answer_batch_size)
+        results = await asyncio.gather(*(
+            self._answer_batch_async([questions[i] for i in batch], document_content,
+                                     [contexts_per_question[i] for i in batch], use_cache)
+            for batch in batches
+        ))
+        return [result for batch_results in results for result in batch_results]
+
+    async def _answer_batch_async(self, questions: List[str], document_content: str,
+                                  contexts_per_question: List[List[str]], use_cache: bool) -> List[Dict]:
+        if len(questions) == 1:
+            return [await self.answer_question_async(questions[0], document_content, contexts_per_question[0],
+                                                     use_cache=use_cache)]
+
+        prompt, contexts_used = self.build_answers_prompt(questions, document_content, contexts_per_question)
+        try:
+            reply = await self._complete_async(prompt, max_tokens=self.batch_answer_tokens * len(questions),
+                                               temperature=0.2, use_cache=use_cache, task='answer_batch',
+                                               response_format=JSON_RESPONSE_FORMAT,
+                                               validate=lambda reply: self.parse_answers(reply, contexts_used))
+            return self.parse_answers(reply, contexts_used)
+        except Exception as e:
+            if not should_split(e):
+                return [self.answer_error(e) for _ in questions]
+        self.batch_splits += 1
+        middle = len(questions) // 2
+        first, second = await asyncio.gather(
+            self._answer_batch_async(questions[:middle], document_content, contexts_per_question[:middle], use_cache),
+            self._answer_batch_async(questions[middle:], document_content, contexts_per_question[middle:], use_cache)
+        )
+        return first + second
+
+    async def evaluate_answers_async(self, items: List[Dict], document_content: str,
+                                     use_cache: bool = True) -> List[Dict]:
+        """Async counterpart of evaluate_answers"""
+        batches = self.batches(len(items), self.evaluation_batch_size)
+        results = await asyncio.gather(*(
+            self._evaluate_batch_async([items[i] for i in batch], document_content, use_cache)
+            for batch in batches
+        ))
+        return [result for batch_results in results for result in batch_results]
+
+    async def _evaluate_batch_async(self, items: List[Dict], document_content: str,
+                                    use_cache: bool) -> List[Dict]:
+        if len(items) == 1:
+            item = items[0]
+            return [await self.evaluate_answer_async(item['user_answer'], item['question'], item['expected_answer'],
+                                                     document_content, use_cache=use_cache)]
+
+        prompt = self.build_evaluations_prompt(items, document_content)
+        try:
+            reply = await self._complete_async(prompt, max_tokens=self.batch_evaluation_tokens * len(items),
+                                               temperature=0.3, use_cache=use_cache, task='evaluation_batch',
+                                               response_format=JSON_RESPONSE_FORMAT,
+                                               validate=lambda reply: self.parse_evaluations(reply, items))
+            return self.parse_evaluations(reply, items)
+        except Exception as e:
+            if not should_split(e):
+                return [self.evaluation_error(e, item['expected_answer']) for item in items]
+        self.batch_splits += 1
+        middle = len(items) // 2
+        first, second = await asyncio.gather(
+            self._evaluate_batch_async(items[:middle], document_content, use_cache),
+            self._evaluate_batch_async(items[middle:], document_content, use_cache)
+        )
+        return first + second
+
+
+class PostUploadTasks:
+    """Summary and challenge questions for a new document, generated concurrently
+
+    Both requests start as soon as the document is processed and run on the
+    background loop, so the wait is the slower of the two calls rather than
+    their sum. Summary deltas are collected as they stream in so the UI can
+    render partial text, and cancel() stops both calls when another file is
+    uploaded.
+    """
+
+    def __init__(self, assistant: AsyncAIAssistant, document_content: str):
+        self._summary_parts: List[str] = []
+        self._questions_taken = False
+        self.summary_future = run_in_background(self._stream_summary(assistant, document_content))
+        self.questions_future = run_in_background(assistant.generate_challenge_questions_async(document_content))
+
+    async def _stream_summary(self, assistant: AsyncAIAssistant, document_content: str) -> str:
+        async for delta in assistant.stream_summary_async(document_content):
+            self._summary_parts.append(delta)
+        return "".join(self._summary_parts).strip()
+
+    def summary_so_far(self) -> str:
+        return "".join(self._summary_parts)
+
+    @property
+    def questions_ready(self) -> bool:
+        return not self._questions_taken and self.questions_future.done() and not self.questions_future.cancelled()
+
+    def take_questions(self, timeout: Optional[float] = None) -> Optional[List[Dict]]:
+        """Prefetched challenge questions (waiting up to timeout), or None if already used or cancelled"""
+        if self._questions_taken or self.questions_future.cancelled():
+            return None
+        questions = self.questions_future.result(timeout=timeout)
+        self._questions_taken = True
+        return questions
+
+    def cancel(self) -> None:
+        self.summary_future.cancel()
+        self.questions_future.cancel()
@@ -0,0 +1,206 @@
+"""Headless batch runner: summarize and answer questions over a folder of documents
+
+Example:
+    python batch_cli.py papers/ --questions questions.txt --output results.jsonl --rpm 30 --tpm 6000
+
+Results are appended to the output JSONL one document at a time. The same
+file is used as the checkpoint: running the command again skips every
+document that already has a successful record.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+from async_assistant import AsyncAIAssistant
+from rate_limiter import RequestScheduler
+from response_cache import ResponseCache
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.txt')
+
+_worker_processor = None
+
+
+def _init_worker(retrieval_mode: str, tokenizer_mode: str, chunk_chars: int, chunk_overlap: int) -> None:
+    """Create one DocumentProcessor per extraction worker"""
+    global _worker_processor
+    from document_processor import DocumentProcessor
+    from pdf_extractor import PDFExtractor
+
+    # Each worker already is a separate process, so no nested PDF page pool
+    _worker_processor = DocumentProcessor(retrieval_mode=retrieval_mode, tokenizer_mode=tokenizer_mode,
+                                          chunk_chars=chunk_chars, chunk_overlap=chunk_overlap,
+                                          pdf_extractor=PDFExtractor(max_workers=1))
+
+
+def _process_file(file_path: str, questions: List[str]) -> Dict:
+    """Worker: process one document and retrieve contexts for every question
+
+    Only what the LLM stage needs is sent back to the parent, not the index.
+    """
+    document = _worker_processor.process_document(file_path)
+    return {
+        'cleaned_text': document.cleaned_text,
+        'word_count': document.word_count,
+        'sentence_count': document.sentence_count,
+        'contexts': [_worker_processor.find_relevant_context(document, q) for q in questions]
+    }
+
+
+def discover_documents(input_dir: str) -> List[str]:
+    paths = []
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+                paths.append(os.path.join(root, name))
+    return sorted(paths)
+
+
+def load_questions(path: Optional[str]) -> List[str]:
+    if not path:
+        return []
+    with open(path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def load_completed(output_path: str) -> Set[str]:
+    """Files that already have a successful record in the output JSONL
+
+    Records with an error, including ones whose answers or summary failed,
+    are not counted, so those files are processed again on resume.
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # partially written last line from an interrupted run
+            if 'error' not in record:
+                completed.add(record['file'])
+    return completed
+
+
+async def run_document(assistant: AsyncAIAssistant, path: str, processed: Dict,
+                       questions: List[str], skip_summary: bool) -> Dict:
+    """LLM stage for one document; its question batches and summary go out concurrently"""
+    cleaned_text = processed['cleaned_text']
+    calls = [assistant.answer_questions_async(questions, cleaned_text, processed['contexts'])]
+    if not skip_summary:
+        calls.append(assistant.generate_summary_async(cleaned_text))
+
+    results = await asyncio.gather(*calls)
+    record = {
+        'file': path,
+        'word_count': processed['word_count'],
+        'sentence_count': processed['sentence_count'],
+        'answers': [dict(result, question=question) for question, result in zip(questions, results[0])]
+    }
+    if not skip_summary:
+        record['summary'] = results[-1]
+
+    # The assistant reports failed calls as error text instead of raising
+    failed = sum(1 for answer in record['answers'] if assistant.is_answer_error(answer))
+    if failed:
+        record['error'] = f"{failed} of {len(questions)} questions failed"
+    if not skip_summary and assistant.is_summary_error(record['summary']):
+        record['error'] = "; ".join(filter(None, [record.get('error'), record['summary']]))
+    return record
+
+
+async def run_batch(args: argparse.Namespace) -> int:
+    questions = load_questions(args.questions)
+    completed = load_completed(args.output)
+    paths = [path for path in discover_documents(args.input_dir) if path not in completed]
+    print(f"{len(paths)} documents to process ({len(completed)} already done)", file=sys.stderr)
+    if not paths:
+        return 0
+
+    scheduler = RequestScheduler(
+        requests_per_minute=args.rpm,
+        tokens_per_minute=args.tpm,
+        max_concurrency=args.concurrency
+    )
+    assistant = AsyncAIAssistant(cache=ResponseCache(db_path=args.cache_db), scheduler=scheduler)
+    assistant.answer_batch_size = args.question_batch_size
+    loop = asyncio.get_running_loop()
+    # Bounds how many extracted documents wait on the LLM stage at once
+    document_slots = asyncio.Semaphore(max(args.workers, args.concurrency) * 2)
+    failures = 0
+    done = 0
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.retrieval_mode, args.tokenizer, args.chunk_chars,
+                                       args.chunk_overlap)) as pool, \
+            open(args.output, 'a', encoding='utf-8') as output:
+
+        async def handle(path: str) -> None:
+            nonlocal failures, done
+            async with document_slots:
+                start = time.perf_counter()
+                try:
+                    processed = await loop.run_in_executor(pool, _process_file, path, questions)
+                    record = await run_document(assistant, path, processed, questions, args.skip_summary)
+                except Exception as e:
+                    record = {'file': path, 'error': str(e)}
+                if 'error' in record:
+                    failures += 1
+                record['elapsed_seconds'] = round(time.perf_counter() - start, 3)
+
+                # Flushed per record so an interrupted run can resume from here
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                done += 1
+                print(f"[{done}/{len(paths)}] {path}", file=sys.stderr)
+
+        await asyncio.gather(*(handle(path) for path in paths))
+
+    print(f"Finished: {done - failures} succeeded, {failures} failed, "
+          f"{scheduler.retries} retries ({scheduler.rate_limited} rate limited), "
+          f"{assistant.batch_splits} question batches split", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run the research assistant pipeline over a folder of documents.")
+    parser.add_argument("input_dir", help="Folder searched recursively for PDF and TXT files")
+    parser.add_argument("--questions", help="Text file with one question per line")
+    parser.add_argument("--output", default="results.jsonl", help="JSONL results file, also used as the checkpoint")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1),
+                        help="Extraction worker processes")
+    parser.add_argument("--concurrency", type=int, default=4, help="Maximum in-flight Groq requests")
+    parser.add_argument("--rpm", type=float, default=30, help="Requests per minute allowed by the API quota")
+    parser.add_argument("--tpm", type=float, default=6000, help="Tokens per minute allowed by the API quota")
+    parser.add_argument("--retrieval-mode", default="bm25", choices=("bm25", "embedding"))
+    parser.add_argument("--tokenizer", default="punkt", choices=("punkt", "regex"),
+                        help="Sentence/word tokenizer; regex is faster but less precise")
+    parser.add_argument("--chunk-chars", type=int, default=400, help="Maximum size of a retrieval chunk")
+    parser.add_argument("--chunk-overlap", type=int, default=80,
+                        help="Characters repeated between chunks of a long paragraph")
+    parser.add_argument("--cache-db", default=os.getenv("LLM_CACHE_DB"), help="SQLite file for the response cache")
+    parser.add_argument("--skip-summary", action="store_true", help="Only answer questions")
+    parser.add_argument("--question-batch-size", type=int, default=5,
+                        help="Questions answered per Groq call (1 asks each question separately)")
+    parser.add_argument("--verbose", action="store_true", help="Log every model routing decision")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # Escalations to a larger model are logged as warnings, other routing decisions as info
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    # httpx logs every request at info level
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return asyncio.run(run_batch(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
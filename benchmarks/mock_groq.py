@@ -0,0 +1,238 @@
+"""Local stand-in for the Groq chat-completions API
+
+Serves POST /openai/v1/chat/completions with the same JSON and SSE shapes
+the SDK expects, so AIAssistant can be benchmarked (or tested) without
+network access or API spend. Point the SDK at it with GROQ_BASE_URL.
+
+    python -m benchmarks.mock_groq --port 8765 --latency 0.2 --rate-limit-ratio 0.1
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+CANNED_REPLY = (
+    "Answer: The document reports improved throughput on the benchmark.\n"
+    "Justification: The results section compares latency against the baseline."
+)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients that time out or hedge abandon requests mid-response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@dataclass
+class MockGroqConfig:
+    latency: float = 0.2  # seconds before the first byte
+    token_latency: float = 0.005  # seconds between streamed chunks
+    rate_limit_ratio: float = 0.0  # fraction of requests answered with 429
+    retry_after: float = 1.0
+    error_ratio: float = 0.0  # fraction answered with 500
+    disconnect_ratio: float = 0.0  # fraction whose connection is dropped without a response
+    slow_ratio: float = 0.0  # fraction delayed by slow_latency more, to test hedging and deadlines
+    slow_latency: float = 5.0
+    model_latency: Dict[str, float] = field(default_factory=dict)  # extra latency per model, for routing
+    reply: str = CANNED_REPLY
+    seed: Optional[int] = None
+
+
+class MockGroqServer:
+    """Threaded HTTP server that fakes chat completions with configurable faults"""
+
+    def __init__(self, config: MockGroqConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockGroqConfig()
+        self.requests = 0
+        self.rate_limited = 0
+        self.disconnected = 0
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._server = _QuietHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockGroqServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-groq", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockGroqServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _roll(self) -> Optional[int]:
+        """Status code to inject for this request, if any; 0 means drop the connection"""
+        config = self.config
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            if roll < config.rate_limit_ratio:
+                self.rate_limited += 1
+                return 429
+            roll -= config.rate_limit_ratio
+            if roll < config.error_ratio:
+                return 500
+            roll -= config.error_ratio
+            if roll < config.disconnect_ratio:
+                self.disconnected += 1
+                return 0
+            return None
+
+    def _extra_latency(self) -> float:
+        with self._lock:
+            return self.config.slow_latency if self._random.random() < self.config.slow_ratio else 0.0
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                config = server.config
+
+                time.sleep(config.latency + server._extra_latency()
+                           + config.model_latency.get(request.get("model"), 0.0))
+                fault = server._roll()
+                if fault == 0:
+                    self.close_connection = True
+                    return
+                if fault == 429:
+                    self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                                    headers={"retry-after": str(config.retry_after)})
+                    return
+                if fault == 500:
+                    self._send_json(500, {"error": {"message": "Internal error", "type": "server_error"}})
+                    return
+
+                prompt = "".join(m.get("content", "") for m in request.get("messages", []))
+                words = config.reply.split(" ")[:max(1, request.get("max_tokens") or 1024)]
+                if request.get("stream"):
+                    self._stream(request, words)
+                else:
+                    self._send_json(200, self._completion(request, " ".join(words), prompt))
+
+            def _completion(self, request, content, prompt):
+                prompt_tokens = len(prompt) // 4
+                completion_tokens = len(content) // 4
+                return {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model"),
+                    "system_fingerprint": "mock",
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                        "logprobs": None
+                    }],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens
+                    }
+                }
+
+            def _stream(self, request, words):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                for i, word in enumerate(words):
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": request.get("model"),
+                        "system_fingerprint": "mock",
+                        "choices": [{
+                            "index": 0,
+                            "delta": {"role": "assistant", "content": word if i == 0 else " " + word},
+                            "finish_reason": None,
+                            "logprobs": None
+                        }]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                    self.wfile.flush()
+                    time.sleep(server.config.token_latency)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+            def _send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a local mock of the Groq chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-latency", type=float, default=0.005)
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--error-ratio", type=float, default=0.0)
+    parser.add_argument("--disconnect-ratio", type=float, default=0.0)
+    parser.add_argument("--slow-ratio", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    args = parser.parse_args()
+
+    config = MockGroqConfig(
+        latency=args.latency,
+        token_latency=args.token_latency,
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        error_ratio=args.error_ratio,
+        disconnect_ratio=args.disconnect_ratio,
+        slow_ratio=args.slow_ratio,
+        slow_latency=args.slow_latency
+    )
+    server = MockGroqServer(config, host=args.host, port=args.port).start()
+    print(f"Mock Groq API listening on {server.base_url} (set GROQ_BASE_URL to this)")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
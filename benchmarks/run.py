@@ -0,0 +1,296 @@
+"""Benchmark runner for document processing, retrieval and AIAssistant latency
+
+    python -m benchmarks.run --sizes 1k,10k,100k --save benchmarks/baselines/main.json
+    python -m benchmarks.run --sizes 1k,10k,100k --compare benchmarks/baselines/main.json
+
+Every (stage, size) case runs in a fresh process so its peak RSS is its own.
+Cold import time of the main modules is measured the same way, each import
+in a new interpreter.
+Results report p50/p95 latency, throughput and peak RSS, and can be saved as
+a JSON baseline and compared against a later run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import SIZES, build_corpus
+
+IMPORT_MODULES = ('document_processor', 'ai_assistant', 'async_assistant', 'corpus')
+
+# Child script timing one cold import; prints seconds and peak RSS in MB
+_IMPORT_PROBE = (
+    "import resource, sys, time\n"
+    "start = time.perf_counter()\n"
+    "__import__(sys.argv[1])\n"
+    "elapsed = time.perf_counter() - start\n"
+    "peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+    "print(elapsed, peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024)\n"
+)
+
+QUERIES = [
+    "What are the main results of the study?",
+    "How does latency compare with the baseline?",
+    "Which dataset was used for the regression analysis?",
+    "What does the model estimate for variance?",
+    "Describe the inference method and its accuracy.",
+]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _timed(fn: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _case_extract_pdf(path: str, repeat: int) -> Dict:
+    from document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    timings = _timed(lambda: processor.extract_text_from_pdf(path), repeat)
+    processor.pdf_extractor.close()
+    return {'timings': timings, 'units': len(processor.extract_pages_from_pdf(path)), 'unit': 'pages'}
+
+
+def _case_process_document(path: str, repeat: int) -> Dict:
+    from document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    document_data = None
+
+    def run():
+        nonlocal document_data
+        document_data = processor.process_document(path)
+
+    timings = _timed(run, repeat)
+    processor.pdf_extractor.close()
+    return {'timings': timings, 'units': document_data.word_count, 'unit': 'words'}
+
+
+def _case_find_relevant_context(path: str, repeat: int) -> Dict:
+    from document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    document_data = processor.process_document(path)
+    timings = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            timings.extend(_timed(lambda: processor.find_relevant_context(document_data, query), 1))
+    return {'timings': timings, 'units': 1, 'unit': 'queries'}
+
+
+def _case_assistant(path: str, repeat: int, base_url: str) -> Dict:
+    os.environ["GROQ_BASE_URL"] = base_url
+    from ai_assistant import AIAssistant
+    from document_processor import DocumentProcessor
+    processor = DocumentProcessor()
+    assistant = AIAssistant()
+    document_data = processor.process_document(path)
+    timings = []
+    first_token = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            contexts = processor.find_relevant_context(document_data, query)
+            stream = assistant.stream_answer(query, document_data.cleaned_text, contexts, use_cache=False)
+            next(stream)
+            first_token.append(time.perf_counter() - start)
+            for _ in stream:
+                pass
+            timings.append(time.perf_counter() - start)
+    return {'timings': timings, 'units': 1, 'unit': 'questions', 'first_token': first_token}
+
+
+STAGES = {
+    'extract_pdf': (_case_extract_pdf, ('pdf',)),
+    'process_document': (_case_process_document, ('txt', 'pdf')),
+    'find_relevant_context': (_case_find_relevant_context, ('txt',)),
+    'assistant_answer': (_case_assistant, ('txt',)),
+}
+
+
+def _run_case(stage: str, args: tuple, queue) -> None:
+    fn = STAGES[stage][0]
+    result = fn(*args)
+    result['peak_rss_mb'] = _peak_rss_mb()
+    queue.put(result)
+
+
+def run_case(stage: str, *args) -> Dict:
+    """Run one case in a fresh spawned process and summarize it"""
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(stage, args, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    timings = result['timings']
+    total = sum(timings)
+    summary = {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'throughput': round(result['units'] * len(timings) / total, 3) if total else 0.0,
+        'throughput_unit': f"{result['unit']}/s",
+        'peak_rss_mb': round(result['peak_rss_mb'], 1)
+    }
+    if 'first_token' in result:
+        summary['ttft_p50_ms'] = round(percentile(result['first_token'], 0.5) * 1000, 3)
+        summary['ttft_p95_ms'] = round(percentile(result['first_token'], 0.95) * 1000, 3)
+    return summary
+
+
+def measure_import(module: str, repeat: int) -> Dict:
+    """Cold import time of a module, each run in a fresh interpreter"""
+    timings = []
+    peak_rss = 0.0
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", _IMPORT_PROBE, module], text=True)
+        elapsed, rss = (float(value) for value in output.split())
+        timings.append(elapsed)
+        peak_rss = max(peak_rss, rss)
+    total = sum(timings)
+    return {
+        'runs': len(timings),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'throughput': round(len(timings) / total, 3) if total else 0.0,
+        'throughput_unit': "imports/s",
+        'peak_rss_mb': round(peak_rss, 1)
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> bool:
+    """Print p50 changes against a baseline; True if any case regressed past threshold"""
+    regressed = False
+    print(f"\nComparison with baseline {baseline['meta'].get('commit')} (threshold {threshold:.0%}):")
+    for key, current in results.items():
+        previous = baseline['results'].get(key)
+        if not previous or not previous['p50_ms']:
+            print(f"  {key:45s} new")
+            continue
+        change = (current['p50_ms'] - previous['p50_ms']) / previous['p50_ms']
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"  {key:45s} p50 {previous['p50_ms']:>10.2f} -> {current['p50_ms']:>10.2f} ms ({change:+.1%}){flag}")
+    return regressed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the research assistant pipeline.")
+    parser.add_argument("--sizes", default="1k,10k,100k", help=f"Comma-separated subset of {','.join(SIZES)}")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated stages to run")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--imports", default=",".join(IMPORT_MODULES),
+                        help="Comma-separated modules to time cold imports of ('' to skip)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "research_assistant_bench"))
+    parser.add_argument("--mock-latency", type=float, default=0.2, help="Mock Groq time to first byte (s)")
+    parser.add_argument("--mock-token-latency", type=float, default=0.005)
+    parser.add_argument("--mock-rate-limit-ratio", type=float, default=0.0)
+    parser.add_argument("--save", help="Write results to this JSON baseline file")
+    parser.add_argument("--compare", help="Compare results against this JSON baseline file")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative p50 slowdown counted as regression")
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in args.sizes.split(",") if size]
+    stages = [stage for stage in args.stages.split(",") if stage]
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"unknown size {name}")
+    for name in stages:
+        if name not in STAGES:
+            parser.error(f"unknown stage {name}")
+
+    build_corpus(args.corpus_dir, sizes)
+
+    from benchmarks.mock_groq import MockGroqConfig, MockGroqServer
+    mock = MockGroqServer(MockGroqConfig(
+        latency=args.mock_latency,
+        token_latency=args.mock_token_latency,
+        rate_limit_ratio=args.mock_rate_limit_ratio
+    )).start()
+
+    results = {}
+    for module in [module for module in args.imports.split(",") if module]:
+        key = f"import/{module}"
+        results[key] = measure_import(module, args.repeat)
+        row = results[key]
+        print(f"{key:45s} p50 {row['p50_ms']:>10.2f} ms  p95 {row['p95_ms']:>10.2f} ms  "
+              f"{'':>12s} {'':<12s} rss {row['peak_rss_mb']:>7.1f} MB")
+
+    try:
+        for stage in stages:
+            for size in sizes:
+                for fmt in STAGES[stage][1]:
+                    path = os.path.join(args.corpus_dir, f"synthetic_{size}.{fmt}")
+                    case_args = (path, args.repeat)
+                    if stage == 'assistant_answer':
+                        case_args += (mock.base_url,)
+                    key = f"{stage}/{fmt}/{size}"
+                    results[key] = run_case(stage, *case_args)
+                    row = results[key]
+                    print(f"{key:45s} p50 {row['p50_ms']:>10.2f} ms  p95 {row['p95_ms']:>10.2f} ms  "
+                          f"{row['throughput']:>12.1f} {row['throughput_unit']:<12s} rss {row['peak_rss_mb']:>7.1f} MB")
+    finally:
+        mock.stop()
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': args.repeat
+        },
+        'results': results
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if compare(results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import os
+import random
+from typing import List
+
+# Vocabulary with a long tail so BM25 sees realistic document frequencies
+_COMMON = ("the of and to in a is that for on with as by this are from be at an was "
+           "which it or were results study data model method analysis these").split()
+_TOPICAL = ("protein neural network gradient sample variance regression cohort enzyme "
+            "benchmark latency throughput baseline accuracy dataset trial inference "
+            "sequence genome transformer cluster policy estimate signal kernel").split()
+
+SIZES = {
+    "1k": 1_000,
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+
+def synthetic_words(word_count: int, seed: int = 0) -> List[str]:
+    """Deterministic pseudo-English word stream"""
+    rng = random.Random(seed)
+    rare = [f"term{i}" for i in range(5000)]
+    words = []
+    for _ in range(word_count):
+        roll = rng.random()
+        if roll < 0.55:
+            words.append(rng.choice(_COMMON))
+        elif roll < 0.9:
+            words.append(rng.choice(_TOPICAL))
+        else:
+            words.append(rng.choice(rare))
+    return words
+
+
+def synthetic_paragraphs(word_count: int, seed: int = 0) -> List[str]:
+    """Paragraphs of 4-8 sentences of 8-25 words each"""
+    rng = random.Random(seed + 1)
+    words = synthetic_words(word_count, seed)
+    paragraphs = []
+    sentences = []
+    i = 0
+    while i < len(words):
+        length = rng.randint(8, 25)
+        chunk = words[i:i + length]
+        i += length
+        sentences.append(" ".join(chunk).capitalize() + ".")
+        if len(sentences) >= rng.randint(4, 8):
+            paragraphs.append(" ".join(sentences))
+            sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def write_txt(path: str, word_count: int, seed: int = 0) -> str:
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n\n".join(synthetic_paragraphs(word_count, seed)))
+    return path
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: str, word_count: int, seed: int = 0, words_per_page: int = 500) -> str:
+    """Write a plain text-only PDF (Helvetica, one text object per page)
+
+    Hand-rolled so generating large corpora needs nothing beyond the standard
+    library; PyPDF2 extracts it like any other text PDF.
+    """
+    words = " ".join(synthetic_paragraphs(word_count, seed)).split()
+    pages = [words[i:i + words_per_page] for i in range(0, len(words), words_per_page)] or [[]]
+
+    objects = []  # index 0 is object 1
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")  # filled in once the page tree exists
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for page_words in pages:
+        lines = [" ".join(page_words[i:i + 12]) for i in range(0, len(page_words), 12)]
+        stream = ["BT /F1 10 Tf 12 TL 50 780 Td"]
+        for line in lines:
+            stream.append(f"({_pdf_escape(line)}) Tj T*")
+        stream.append("ET")
+        content = "\n".join(stream).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+
+    with open(path, "wb") as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (len(objects) + 1, catalog_id, xref_offset))
+    return path
+
+
+def build_corpus(directory: str, sizes: List[str], formats: List[str] = ("txt", "pdf")) -> List[str]:
+    """Generate (or reuse) one file per size and format, returning their paths"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for size in sizes:
+        for fmt in formats:
+            path = os.path.join(directory, f"synthetic_{size}.{fmt}")
+            if not os.path.exists(path):
+                writer = write_txt if fmt == "txt" else write_pdf
+                writer(path, SIZES[size])
+            paths.append(path)
+    return paths
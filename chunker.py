@@ -0,0 +1,135 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Iterator, List, Sequence, Tuple
+
+# A paragraph is a run of text between newlines; cleaned text keeps them
+# apart with a blank line and has no line breaks inside them
+_BLOCK = re.compile(r'[^\n]+')
+# End of a sentence, possibly inside quotes or brackets; paragraphs without one are headings
+_SENTENCE_END = re.compile(r'[.!?]["\'\u201d\u2019)\]]*$')
+
+
+class Chunker:
+    """Splits text into size-bounded retrieval chunks along its layout
+
+    Chunks never cross a page boundary. Short paragraphs on the same page
+    are merged into one chunk as long as the result fits max_chars, and
+    headings (paragraphs that do not end a sentence) at the end of a chunk
+    move on to the next one, so they stay with the text below them. A
+    paragraph too long for one
+    chunk is cut at sentence boundaries, and each of its chunks after the
+    first repeats the last sentences of the previous one, up to
+    overlap_chars, so a passage cut in two can still be found whole. A
+    sentence longer than max_chars on its own is cut at a space.
+    """
+
+    def __init__(self, max_chars: int = 400, overlap_chars: int = 80):
+        if max_chars <= 0:
+            raise ValueError("max_chars must be positive")
+        if not 0 <= overlap_chars < max_chars:
+            raise ValueError("overlap_chars must be at least 0 and smaller than max_chars")
+        self.max_chars = max_chars
+        self.overlap_chars = overlap_chars
+
+    def chunk(self, text: str, sentence_spans: array,
+              page_starts: Sequence[Tuple[int, int]] = ()) -> Tuple[array, array]:
+        """Flat (start, end) offsets of each chunk, and the page of each chunk (0 without pages)"""
+        chunk_spans = array('i')
+        chunk_pages = array('i')
+        sentence_starts = sentence_spans[0::2]
+        page_offsets = [offset for offset, _ in page_starts]
+
+        current: List[Tuple[int, int]] = []  # pieces of the chunk being built
+        current_page = 0
+
+        def flush() -> None:
+            if current:
+                chunk_spans.append(current[0][0])
+                chunk_spans.append(current[-1][1])
+                chunk_pages.append(current_page)
+
+        for block_start, block_end in self._blocks(text):
+            page = page_starts[bisect_right(page_offsets, block_start) - 1][1] if page_starts else 0
+            if current and page != current_page:
+                flush()
+                current = []
+            elif current and block_end - current[0][0] > self.max_chars:
+                headings = self._trailing_headings(text, current)
+                current = current[:len(current) - len(headings)]
+                flush()
+                current = headings
+            current_page = page
+            if current and block_end - current[0][0] <= self.max_chars:
+                # The whole paragraph fits next to the previous one
+                current.append((block_start, block_end))
+                continue
+
+            for piece in self._pieces(text, block_start, block_end, sentence_starts):
+                if current and piece[1] - current[0][0] > self.max_chars:
+                    flush()
+                    current = self._overlap(current, piece)
+                current.append(piece)
+        flush()
+        return chunk_spans, chunk_pages
+
+    @staticmethod
+    def _trailing_headings(text: str, pieces: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Whole paragraphs at the end of pieces that do not end a sentence"""
+        count = 0
+        for start, end in reversed(pieces):
+            whole = (start == 0 or text[start - 1] == '\n') and (end == len(text) or text[end] == '\n')
+            if not whole or _SENTENCE_END.search(text, start, end):
+                break
+            count += 1
+        return pieces[len(pieces) - count:]
+
+    def _overlap(self, previous: List[Tuple[int, int]], piece: Tuple[int, int]) -> List[Tuple[int, int]]:
+        """Trailing pieces of the previous chunk to repeat before piece"""
+        end = previous[-1][1]
+        carried = []
+        for start, stop in reversed(previous[1:]):
+            if end - start > self.overlap_chars or piece[1] - start > self.max_chars:
+                break
+            carried.insert(0, (start, stop))
+        return carried
+
+    @staticmethod
+    def _blocks(text: str) -> Iterator[Tuple[int, int]]:
+        for match in _BLOCK.finditer(text):
+            start, end = match.span()
+            while start < end and text[start].isspace():
+                start += 1
+            while end > start and text[end - 1].isspace():
+                end -= 1
+            if start < end:
+                yield start, end
+
+    def _pieces(self, text: str, start: int, end: int, sentence_starts: array) -> Iterator[Tuple[int, int]]:
+        """Sentences of a paragraph, clipped to it, with over-long ones cut at spaces"""
+        first = bisect_right(sentence_starts, start)
+        last = bisect_left(sentence_starts, end)
+        bounds = [start] + list(sentence_starts[first:last]) + [end]
+        for piece_start, piece_end in zip(bounds, bounds[1:]):
+            while piece_end > piece_start and text[piece_end - 1].isspace():
+                piece_end -= 1
+            while piece_start < piece_end:
+                cut = piece_end
+                if cut - piece_start > self.max_chars:
+                    cut = text.rfind(' ', piece_start + 1, piece_start + self.max_chars + 1)
+                    if cut < 0:
+                        cut = piece_start + self.max_chars
+                yield piece_start, cut
+                piece_start = cut
+                while piece_start < piece_end and text[piece_start].isspace():
+                    piece_start += 1
+
+    @staticmethod
+    def sentence_ranges(chunk_spans: array, sentence_spans: array) -> List[Tuple[int, int]]:
+        """(first, end) range of the sentences overlapping each chunk"""
+        sentence_starts = sentence_spans[0::2]
+        sentence_ends = sentence_spans[1::2]
+        return [
+            (bisect_right(sentence_ends, chunk_spans[i]), bisect_left(sentence_starts, chunk_spans[i + 1]))
+            for i in range(0, len(chunk_spans), 2)
+        ]
@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional
+
+# Context window (in tokens) of each Groq model we use
+MODEL_CONTEXT_WINDOWS: Dict[str, int] = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Headroom for chat formatting and tokenizer mismatch (cl100k is not Llama's tokenizer)
+SAFETY_MARGIN = 0.1
+
+
+class TokenCounter:
+    """Token counting with tiktoken, falling back to a ~4 chars/token estimate
+
+    tiktoken fetches its encoding files on first use. If that fails (for
+    example on an offline box), counting degrades to the estimate instead of
+    breaking prompt construction.
+    """
+
+    CHARS_PER_TOKEN = 4
+
+    def __init__(self, encoding_name: str = "cl100k_base"):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loaded = False
+
+    @property
+    def encoding(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                import tiktoken
+                self._encoding = tiktoken.get_encoding(self.encoding_name)
+            except Exception:
+                self._encoding = None
+        return self._encoding
+
+    def count(self, text: str) -> int:
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+        return (len(text) + self.CHARS_PER_TOKEN - 1) // self.CHARS_PER_TOKEN
+
+    def split(self, text: str, max_tokens: int) -> List[str]:
+        """Cut text into consecutive pieces of at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return []
+        if self.encoding is not None:
+            tokens = self.encoding.encode(text, disallowed_special=())
+            return [self.encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+        size = max_tokens * self.CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """First max_tokens tokens of text, without encoding all of a long document"""
+        if max_tokens <= 0:
+            return ""
+        if len(text) <= max_tokens:
+            return text
+        # Tokens rarely span more than a few characters, so a generous prefix
+        # almost always holds max_tokens of them
+        prefix = text[:max_tokens * 16]
+        pieces = self.split(prefix, max_tokens)
+        if len(pieces) > 1 or len(prefix) == len(text):
+            return pieces[0] if pieces else ""
+        return self.split(text, max_tokens)[0]
+
+
+class ContextPacker:
+    """Fits document text into a model's context window by token count"""
+
+    def __init__(self, counter: Optional[TokenCounter] = None):
+        self.counter = counter or TokenCounter()
+
+    def context_window(self, model: str) -> int:
+        return MODEL_CONTEXT_WINDOWS.get(model, DEFAULT_CONTEXT_WINDOW)
+
+    def budget(self, model: str, prompt_template: str, max_tokens: int,
+               cap: Optional[int] = None) -> int:
+        """Tokens left for document content in a prompt
+
+        prompt_template is the prompt rendered with empty content, so its
+        instructions are counted too. max_tokens is the completion budget
+        reserved for the reply, and cap optionally limits the result further.
+        """
+        usable = int(self.context_window(model) * (1 - SAFETY_MARGIN))
+        available = usable - max_tokens - self.counter.count(prompt_template)
+        if cap is not None:
+            available = min(available, cap)
+        return max(0, available)
+
+    def pack(self, chunks: List[str], budget: int, separator: str = "\n\n") -> str:
+        """Join ranked chunks, best first, skipping any that no longer fit"""
+        separator_tokens = self.counter.count(separator)
+        packed = []
+        used = 0
+        for chunk in chunks:
+            cost = self.counter.count(chunk) + (separator_tokens if packed else 0)
+            if used + cost > budget:
+                continue
+            packed.append(chunk)
+            used += cost
+        return separator.join(packed)
+
+    def fits(self, text: str, budget: int) -> bool:
+        # Every token covers at least one character, so short text always fits
+        return len(text) <= budget or self.counter.count(text) <= budget
+
+    def split(self, text: str, budget: int, separator: str = "\n\n") -> List[str]:
+        """Cut text into pieces of at most budget tokens, at paragraph breaks where possible
+
+        Consecutive paragraphs are packed together; only a paragraph larger
+        than the whole budget is cut mid-text.
+        """
+        if budget <= 0:
+            return []
+        separator_tokens = self.counter.count(separator)
+        pieces = []
+        current: List[str] = []
+        used = 0
+        for paragraph in text.split(separator):
+            cost = self.counter.count(paragraph)
+            if current and used + separator_tokens + cost > budget:
+                pieces.append(separator.join(current))
+                current, used = [], 0
+            if cost > budget:
+                pieces.extend(self.counter.split(paragraph, budget))
+                continue
+            used += cost + (separator_tokens if current else 0)
+            current.append(paragraph)
+        if current:
+            pieces.append(separator.join(current))
+        return pieces
+
+    def truncate(self, text: str, budget: int) -> str:
+        return self.counter.truncate(text, budget)
@@ -0,0 +1,165 @@
+import heapq
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from document import Document
+from document_processor import DocumentProcessor
+from metrics import metrics
+from pdf_extractor import ProgressCallback
+
+
+class Corpus:
+    """A library of processed documents searched as one collection
+
+    Every document keeps its own index shard (its BM25 index or vector
+    store), so adding or removing a paper only touches that paper. BM25
+    shards are scored with corpus-wide document frequencies, which are
+    updated incrementally, so their scores can be merged directly. Shards
+    are searched in a thread pool and the per-shard top-k lists are merged
+    into a global top-k.
+    """
+
+    def __init__(self, processor: DocumentProcessor, max_workers: int = 4):
+        self.processor = processor
+        self.max_workers = max_workers
+        self._documents: Dict[str, Document] = {}
+        self._names: Dict[str, str] = {}
+        self._doc_freqs: Dict[str, int] = {}
+        self._unit_count = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._documents
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="corpus")
+        return self._executor
+
+    def ids(self) -> List[str]:
+        return list(self._documents)
+
+    def name(self, doc_id: str) -> str:
+        return self._names[doc_id]
+
+    def get(self, doc_id: str) -> Optional[Document]:
+        return self._documents.get(doc_id)
+
+    def add_file(self, file_path: str, doc_id: str = None, name: str = None,
+                 progress_callback: ProgressCallback = None) -> Document:
+        """Process a file and add it to the corpus"""
+        document = self.processor.process_document(file_path, progress_callback)
+        self.add(doc_id or file_path, document, name=name)
+        return document
+
+    def add(self, doc_id: str, document: Document, name: str = None) -> None:
+        """Add a processed document, replacing any document with the same ID"""
+        with self._lock:
+            if doc_id in self._documents:
+                self._remove(doc_id)
+            self._documents[doc_id] = document
+            self._names[doc_id] = name or doc_id
+            self._update_stats(document, 1)
+
+    def remove(self, doc_id: str) -> None:
+        with self._lock:
+            if doc_id in self._documents:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id: str) -> None:
+        document = self._documents.pop(doc_id)
+        del self._names[doc_id]
+        self._update_stats(document, -1)
+
+    def _update_stats(self, document: Document, sign: int) -> None:
+        index = document.index
+        self._unit_count += sign * index.doc_count
+        for term, postings in index.postings.items():
+            count = self._doc_freqs.get(term, 0) + sign * len(postings)
+            if count > 0:
+                self._doc_freqs[term] = count
+            else:
+                self._doc_freqs.pop(term, None)
+
+    def idf(self, term: str) -> float:
+        """Corpus-wide IDF, same formula as BM25Index.idf"""
+        df = self._doc_freqs.get(term, 0)
+        return math.log(1 + (self._unit_count - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict]:
+        """Top-k chunks across all documents, best first
+
+        Each hit is a dict with doc_id, name, chunk (its index in the
+        document) and score.
+        """
+        with metrics.timer('corpus.search'):
+            with self._lock:
+                shards = list(self._documents.items())
+            if not shards:
+                return []
+
+            terms = self.processor.tokenize_for_index(query)
+            vector = None
+            if self.processor.retrieval_mode == 'embedding':
+                vector = self.processor.embedder.encode([query])[0]
+
+            def search_shard(document: Document) -> List[Tuple[float, int]]:
+                if vector is not None and document.vector_store is not None:
+                    return document.vector_store.search(vector, top_k=top_k)
+                return document.index.search(terms, top_k=top_k, idf=self.idf)
+
+            if len(shards) == 1:
+                results = [search_shard(shards[0][1])]
+            else:
+                results = list(self.executor.map(search_shard, [document for _, document in shards]))
+
+            # Ties keep corpus order, then document order
+            candidates = (
+                (score, -shard, -chunk)
+                for shard, hits in enumerate(results)
+                for score, chunk in hits
+            )
+            hits = []
+            for score, neg_shard, neg_chunk in heapq.nlargest(top_k, candidates):
+                doc_id = shards[-neg_shard][0]
+                hits.append({
+                    'doc_id': doc_id,
+                    'name': self._names.get(doc_id, doc_id),
+                    'chunk': -neg_chunk,
+                    'score': score
+                })
+            return hits
+
+    def find_relevant_context(self, query: str, max_chars: int = None, top_k: int = 5) -> List[str]:
+        """Relevant passages from across the corpus, each cited as '[name, Page N]'
+
+        Hits on overlapping chunks of one document are merged into a single
+        passage, ranked by its best hit.
+        """
+        hits = self.search(query, top_k=top_k)
+        ranked = []
+        for doc_id in dict.fromkeys(hit['doc_id'] for hit in hits):
+            document = self._documents.get(doc_id)
+            if document is None:
+                continue  # removed while searching
+            ranks = [rank for rank, hit in enumerate(hits) if hit['doc_id'] == doc_id]
+            passages = self.processor.chunk_passages(document, [hits[rank]['chunk'] for rank in ranks])
+            for position, first, last in passages:
+                context = self.processor.passage_context(
+                    document, first, last, max_chars, source=self._names.get(doc_id, doc_id)
+                )
+                ranked.append((ranks[position], context))
+        return [context for _, context in sorted(ranked)]
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
@@ -0,0 +1,106 @@
+import sys
+from array import array
+from typing import Iterator, List, Optional, Union
+
+
+def text_spans(text: str, pieces: List[str]) -> Optional[array]:
+    """Flat (start, end) offsets of each piece in text, or None if one is missing"""
+    spans = array('i')
+    cursor = 0
+    for piece in pieces:
+        start = text.find(piece, cursor)
+        if start < 0:
+            return None
+        cursor = start + len(piece)
+        spans.append(start)
+        spans.append(cursor)
+    return spans
+
+
+class TextSpans:
+    """Read-only sequence of substrings, sliced from the text only when accessed"""
+
+    __slots__ = ('text', 'spans')
+
+    def __init__(self, text: str, spans: array):
+        self.text = text
+        self.spans = spans
+
+    def __len__(self) -> int:
+        return len(self.spans) // 2
+
+    def __getitem__(self, item: Union[int, slice]) -> Union[str, List[str]]:
+        if isinstance(item, slice):
+            return [self[i] for i in range(*item.indices(len(self)))]
+        if item < 0:
+            item += len(self)
+        if not 0 <= item < len(self):
+            raise IndexError("span index out of range")
+        return self.text[self.spans[2 * item]:self.spans[2 * item + 1]]
+
+    def __iter__(self) -> Iterator[str]:
+        spans = self.spans
+        for i in range(0, len(spans), 2):
+            yield self.text[spans[i]:spans[i + 1]]
+
+
+class Document:
+    """A processed document that holds its cleaned text exactly once
+
+    Sentences, paragraphs and retrieval chunks are int32 (start, end) offset
+    pairs into cleaned_text and are only turned into strings when read, so a
+    session keeps one copy of the text plus a few bytes per sentence instead
+    of the text, its sentence list and its paragraph list. The index and
+    vector store have one entry per chunk, and chunk_pages holds each
+    chunk's page (empty when the document has no pages).
+    """
+
+    __slots__ = ('cleaned_text', 'sentence_spans', 'paragraph_spans', 'word_count',
+                 'sentence_pages', 'chunk_spans', 'chunk_pages', 'index', 'vector_store')
+
+    def __init__(self, cleaned_text: str, sentence_spans: array, paragraph_spans: array,
+                 word_count: int, sentence_pages: array = None, chunk_spans: array = None,
+                 chunk_pages: array = None, index=None, vector_store=None):
+        self.cleaned_text = cleaned_text
+        self.sentence_spans = sentence_spans
+        self.paragraph_spans = paragraph_spans
+        self.word_count = word_count
+        self.sentence_pages = sentence_pages if sentence_pages is not None else array('i')
+        self.chunk_spans = chunk_spans if chunk_spans is not None else array('i')
+        self.chunk_pages = chunk_pages if chunk_pages is not None else array('i')
+        self.index = index
+        self.vector_store = vector_store
+
+    @property
+    def sentences(self) -> TextSpans:
+        return TextSpans(self.cleaned_text, self.sentence_spans)
+
+    @property
+    def paragraphs(self) -> TextSpans:
+        return TextSpans(self.cleaned_text, self.paragraph_spans)
+
+    @property
+    def chunks(self) -> TextSpans:
+        return TextSpans(self.cleaned_text, self.chunk_spans)
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_spans) // 2
+
+    @property
+    def paragraph_count(self) -> int:
+        return len(self.paragraph_spans) // 2
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunk_spans) // 2
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this document, for byte-budgeted stores"""
+        size = sys.getsizeof(self.cleaned_text)
+        for values in (self.sentence_spans, self.paragraph_spans, self.sentence_pages,
+                       self.chunk_spans, self.chunk_pages):
+            size += values.itemsize * len(values)
+        if self.index is not None:
+            size += self.index.nbytes()
+        return size
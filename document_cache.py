@@ -0,0 +1,200 @@
+import hashlib
+import json
+import os
+import stat
+import struct
+import threading
+import zlib
+from array import array
+from typing import Optional
+
+from document import Document
+from search_index import BM25Index
+
+# Per-user root for everything the app keeps on disk between runs
+CACHE_ROOT = os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                          "research_assistant")
+DEFAULT_CACHE_DIR = os.path.join(CACHE_ROOT, "documents")
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_FORMAT_VERSION = 3
+
+# int32 offset arrays stored after the cleaned text, in this order
+_DOCUMENT_ARRAYS = ('sentence_spans', 'paragraph_spans', 'sentence_pages', 'chunk_spans', 'chunk_pages')
+_INDEX_ARRAYS = ('offsets', 'unit_ids', 'term_freqs', 'doc_lengths')
+_HEADER_SIZE = struct.Struct('<I')
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's bytes, read in chunks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def private_cache_dir(path: str) -> str:
+    """Create path readable by the current user only, and refuse one owned by someone else"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if hasattr(os, 'getuid'):
+        info = os.stat(path)
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"Cache directory {path} is owned by another user")
+        if stat.S_IMODE(info.st_mode) & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+def encode_document(document: Document) -> bytes:
+    """Serialize a document as a JSON header, its UTF-8 text and raw int32 arrays
+
+    Nothing in the format is executed on load, unlike a pickle.
+    """
+    text = document.cleaned_text.encode('utf-8')
+    arrays = [getattr(document, name) for name in _DOCUMENT_ARRAYS]
+    header = {
+        'format': CACHE_FORMAT_VERSION,
+        'word_count': document.word_count,
+        'text_bytes': len(text),
+        'index': None,
+        'vector_store': document.vector_store.path if document.vector_store is not None else None
+    }
+    if document.index is not None:
+        state = document.index.__getstate__()
+        header['index'] = {'k1': state['k1'], 'b': state['b'], 'terms': state['terms']}
+        arrays += [state[name] for name in _INDEX_ARRAYS]
+    header['lengths'] = [len(values) for values in arrays]
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    parts = [_HEADER_SIZE.pack(len(header_bytes)), header_bytes, text]
+    parts += [values.tobytes() for values in arrays]
+    return zlib.compress(b''.join(parts))
+
+
+def decode_document(blob: bytes) -> Optional[Document]:
+    """Inverse of encode_document; None if the entry was written by another format version"""
+    data = memoryview(zlib.decompress(blob))
+    (header_size,) = _HEADER_SIZE.unpack_from(data)
+    position = _HEADER_SIZE.size + header_size
+    header = json.loads(bytes(data[_HEADER_SIZE.size:position]))
+    if header.get('format') != CACHE_FORMAT_VERSION:
+        return None
+
+    text = str(data[position:position + header['text_bytes']], 'utf-8')
+    position += header['text_bytes']
+    arrays = []
+    for length in header['lengths']:
+        values = array('i')
+        values.frombytes(data[position:position + length * values.itemsize])
+        position += length * values.itemsize
+        arrays.append(values)
+
+    index = None
+    if header['index'] is not None:
+        state = dict(header['index'], **dict(zip(_INDEX_ARRAYS, arrays[len(_DOCUMENT_ARRAYS):])))
+        index = BM25Index()
+        index.__setstate__(state)
+    vector_store = None
+    if header['vector_store'] is not None:
+        # numpy is only loaded for documents that were embedded
+        from vector_store import VectorStore
+        vector_store = VectorStore(header['vector_store'])
+    return Document(text, word_count=header['word_count'], index=index, vector_store=vector_store,
+                    **dict(zip(_DOCUMENT_ARRAYS, arrays)))
+
+
+class DocumentCache:
+    """Content-addressed on-disk cache of processed documents with LRU eviction
+
+    Entries are keyed by the SHA-256 of the uploaded file plus the processor
+    version, so the same file uploaded under another name is still a hit.
+    Documents already keep sentences and paragraphs as offsets into the
+    cleaned text, so an entry is that text plus flat int32 arrays (see
+    encode_document), zlib-compressed. The directory is private to the
+    user running the app. Recency is tracked with file mtimes, and the
+    least recently used entries are deleted once the directory grows past
+    max_bytes.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None):
+        self.cache_dir = cache_dir or os.getenv("DOCUMENT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        if max_bytes is None:
+            max_bytes = int(os.getenv("DOCUMENT_CACHE_MAX_MB", DEFAULT_CACHE_MAX_BYTES // (1024 * 1024))) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        private_cache_dir(self.cache_dir)
+
+    def key_for_file(self, file_path: str, namespace: str) -> str:
+        """Cache key for a file processed under a given processor namespace"""
+        return f"{file_sha256(file_path)}-{namespace}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.bin")
+
+    def get(self, key: str) -> Optional[Document]:
+        """Return the cached document or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                document = decode_document(file.read())
+        except FileNotFoundError:
+            return None
+        except Exception:
+            document = None
+        if document is None:
+            # Corrupt or incompatible entry; drop it and reprocess
+            self._remove(path)
+            return None
+
+        vector_store = document.vector_store
+        if vector_store is not None and not vector_store.has_shape(document.chunk_count):
+            return None
+
+        # Touch the entry so it counts as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return document
+
+    def put(self, key: str, document: Document) -> None:
+        """Store a document and evict old entries if over budget"""
+        blob = encode_document(document)
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as file:
+            file.write(blob)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.cache_dir):
+                if not entry.name.endswith('.bin'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def clear(self) -> None:
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith('.bin'):
+                self._remove(entry.path)
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
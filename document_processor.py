@@ -1,85 +1,245 @@
-
-import PyPDF2
-import nltk
-#nltk.download('punkt')
-
-from nltk.tokenize import sent_tokenize, word_tokenize
-from nltk.corpus import stopwords
 import re
-from typing import List, Dict, Tuple
+import hashlib
+import mmap
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 import os
 
-# Download required NLTK data
-try:
-    nltk.data.find('tokenizers/punkt_tab')
-except LookupError:
-    nltk.download('punkt_tab')
+from chunker import Chunker
+from document import Document, text_spans
+from document_cache import DocumentCache
+from metrics import metrics
+from pdf_extractor import PDFExtractor, ProgressCallback
+from search_index import BM25Index
+from tokenizer import ENGLISH_STOP_WORDS, Tokenizer, TokenizedText
+
+if TYPE_CHECKING:
+    from vector_store import SentenceEmbedder, VectorStore
+
+# Bump whenever process_document output changes so cached documents are rebuilt
+PROCESSOR_VERSION = "8"
+RETRIEVAL_MODES = ('bm25', 'embedding')
+
+# Whitespace inside a paragraph, and the blank lines between paragraphs
+_WHITESPACE = re.compile(r'\s+')
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+# A line holding nothing but a number, usually a page number
+_NUMBER_LINE = re.compile(r'\n[ \t]*\d+[ \t]*(?=\n)')
+
+# Called with the name of each processing stage as it starts: 'extract',
+# 'clean' (TXT only; PDF pages are cleaned as they are extracted),
+# 'tokenize', 'chunk', 'index' and, in embedding mode, 'embed'
+StageCallback = Callable[[str], None]
 
-try:
-    nltk.data.find('corpora/stopwords')
-except LookupError:
-    nltk.download('stopwords')
+@contextmanager
+def _stage(name: str, stage_callback: StageCallback = None):
+    if stage_callback:
+        stage_callback(name)
+    with metrics.timer(f'document.{name}'):
+        yield
 
 class DocumentProcessor:
-    def __init__(self):
-        self.stop_words = set(stopwords.words('english'))
+    def __init__(self, retrieval_mode: str = 'bm25', embedder: "SentenceEmbedder" = None,
+                 vector_dir: str = None, vector_dtype: str = 'float32',
+                 cache: DocumentCache = None, pdf_extractor: PDFExtractor = None,
+                 tokenizer_mode: str = 'punkt', chunk_chars: int = 400, chunk_overlap: int = 80):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unsupported retrieval mode: {retrieval_mode}. Use one of {RETRIEVAL_MODES}.")
+        if vector_dtype not in ('float32', 'float16'):
+            raise ValueError("vector_dtype must be 'float32' or 'float16'")
+        
+        self.stop_words = set(ENGLISH_STOP_WORDS)
+        self.tokenizer = Tokenizer(tokenizer_mode, self.stop_words)
+        self.chunker = Chunker(chunk_chars, chunk_overlap)
+        self.retrieval_mode = retrieval_mode
+        self.vector_dir = vector_dir
+        self.vector_dtype = vector_dtype
+        self.cache = cache
+        self.pdf_extractor = pdf_extractor or PDFExtractor()
+        self._embedder = embedder
     
-    def extract_text_from_pdf(self, pdf_path: str) -> str:
-        """Extract text from PDF file"""
+    @property
+    def cache_namespace(self) -> str:
+        """Part of the cache key covering everything that changes the output"""
+        namespace = (f"v{PROCESSOR_VERSION}-{self.retrieval_mode}-{self.tokenizer.mode}"
+                     f"-c{self.chunker.max_chars}o{self.chunker.overlap_chars}")
+        if self.retrieval_mode == 'embedding':
+            model_tag = hashlib.sha256(self.embedder.model_name.encode('utf-8')).hexdigest()[:12]
+            namespace += f"-{self.vector_dtype}-{model_tag}"
+        return namespace
+    
+    @property
+    def embedder(self) -> "SentenceEmbedder":
+        if self._embedder is None:
+            # numpy and the vector store are only loaded for embedding retrieval
+            from vector_store import SentenceEmbedder
+            self._embedder = SentenceEmbedder()
+        return self._embedder
+    
+    def iter_pages_from_pdf(self, pdf_path: str, progress_callback: ProgressCallback = None) -> Iterator[str]:
+        """Yield the text of each PDF page, in page order, as it is extracted"""
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+            for _, text in self.pdf_extractor.iter_pages(pdf_path, progress_callback):
+                yield text
         except Exception as e:
             raise Exception(f"Error reading PDF: {str(e)}")
     
+    def extract_pages_from_pdf(self, pdf_path: str, progress_callback: ProgressCallback = None) -> List[str]:
+        """Extract the text of each PDF page, in page order"""
+        return list(self.iter_pages_from_pdf(pdf_path, progress_callback))
+    
+    def extract_text_from_pdf(self, pdf_path: str, progress_callback: ProgressCallback = None) -> str:
+        """Extract text from PDF file"""
+        return "\n".join(self.extract_pages_from_pdf(pdf_path, progress_callback)).strip()
+    
     def extract_text_from_txt(self, txt_path: str) -> str:
-        """Extract text from TXT file"""
+        """Extract text from TXT file
+        
+        The file is memory-mapped and the stripped range decoded straight
+        from the page cache, so a large file is held once, as the decoded
+        text, rather than also as bytes and as an unstripped copy.
+        """
         try:
-            with open(txt_path, 'r', encoding='utf-8') as file:
-                return file.read().strip()
+            with open(txt_path, 'rb') as file:
+                if os.fstat(file.fileno()).st_size == 0:
+                    return ""
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    start, end = 0, len(mapped)
+                    while start < end and mapped[start:start + 1].isspace():
+                        start += 1
+                    while end > start and mapped[end - 1:end].isspace():
+                        end -= 1
+                    with memoryview(mapped)[start:end] as view:
+                        return str(view, 'utf-8')
         except Exception as e:
             raise Exception(f"Error reading TXT file: {str(e)}")
     
-    def process_document(self, file_path: str) -> Dict:
-        """Process uploaded document and extract structured information"""
+    def process_document(self, file_path: str, progress_callback: ProgressCallback = None,
+                         stage_callback: StageCallback = None) -> Document:
+        """Process uploaded document and extract structured information
+        
+        progress_callback, if given, is called with (pages_done, total_pages)
+        while a PDF is being extracted, and stage_callback with the name of
+        each stage as it starts. Either may raise to abort processing.
+        """
+        with metrics.timer('document.process'):
+            return self._process_document(file_path, progress_callback, stage_callback)
+    
+    def _process_document(self, file_path: str, progress_callback: ProgressCallback = None,
+                          stage_callback: StageCallback = None) -> Document:
         file_extension = os.path.splitext(file_path)[1].lower()
         
-        if file_extension == '.pdf':
-            text = self.extract_text_from_pdf(file_path)
-        elif file_extension == '.txt':
-            text = self.extract_text_from_txt(file_path)
-        else:
-            raise ValueError("Unsupported file format. Please upload PDF or TXT files.")
+        cache_key = None
+        if self.cache is not None and file_extension in ('.pdf', '.txt'):
+            with metrics.timer('document.cache_lookup'):
+                cache_key = self.cache.key_for_file(file_path, self.cache_namespace)
+                cached = self.cache.get(cache_key)
+            metrics.record_cache('document.cache_lookup', cached is not None)
+            if cached is not None:
+                return cached
+        
+        with _stage('extract', stage_callback):
+            if file_extension == '.pdf':
+                # Each page is cleaned as soon as it is extracted, so its raw
+                # text is dropped right away instead of holding every page
+                cleaned_text, page_starts = self.clean_pages(self.iter_pages_from_pdf(file_path, progress_callback))
+            elif file_extension == '.txt':
+                text = self.extract_text_from_txt(file_path)
+            else:
+                raise ValueError("Unsupported file format. Please upload PDF or TXT files.")
         
         # Clean and structure the text
-        cleaned_text = self.clean_text(text)
-        sentences = sent_tokenize(cleaned_text)
-        paragraphs = self.extract_paragraphs(cleaned_text)
-        
-        return {
-            'raw_text': text,
-            'cleaned_text': cleaned_text,
-            'sentences': sentences,
-            'paragraphs': paragraphs,
-            'word_count': len(word_tokenize(cleaned_text)),
-            'sentence_count': len(sentences)
-        }
+        if file_extension == '.txt':
+            with _stage('clean', stage_callback):
+                cleaned_text = self.clean_text(text)
+                page_starts = []
+        
+        document = self.build_document(cleaned_text, page_starts, stage_callback)
+        if self.retrieval_mode == 'embedding':
+            with _stage('embed', stage_callback):
+                document.vector_store = self.build_vector_store(list(document.chunks))
+        
+        if cache_key is not None:
+            with metrics.timer('document.cache_store'):
+                self.cache.put(cache_key, document)
+        
+        return document
+    
+    def build_document(self, cleaned_text: str, page_starts: List[Tuple[int, int]] = (),
+                       stage_callback: StageCallback = None) -> Document:
+        """Tokenize, chunk and index cleaned text (everything but embeddings)"""
+        with _stage('tokenize', stage_callback):
+            cleaned_text, tokenized = self.tokenizer.tokenize(cleaned_text)
+        with _stage('chunk', stage_callback):
+            paragraph_spans = text_spans(cleaned_text, self.extract_paragraphs(cleaned_text)) or array('i')
+            chunk_spans, chunk_pages = self.chunker.chunk(cleaned_text, tokenized.sentence_spans, page_starts)
+        with _stage('index', stage_callback):
+            index = self.build_index(cleaned_text, tokenized, chunk_spans)
+        
+        return Document(
+            cleaned_text=cleaned_text,
+            sentence_spans=tokenized.sentence_spans,
+            paragraph_spans=paragraph_spans,
+            word_count=tokenized.word_count,
+            sentence_pages=self.map_sentences_to_pages(tokenized.sentence_spans, page_starts),
+            chunk_spans=chunk_spans,
+            chunk_pages=chunk_pages if page_starts else array('i'),
+            index=index
+        )
     
     def clean_text(self, text: str) -> str:
-        """Clean and normalize text"""
-        # Remove extra whitespace and normalize
-        text = re.sub(r'\s+', ' ', text)
-        text = text.strip()
+        """Normalize whitespace, keeping paragraphs apart with one blank line"""
+        # Remove page numbers standing on their own line
+        text = _NUMBER_LINE.sub('', text)
+        paragraphs = (_WHITESPACE.sub(' ', block).strip() for block in _PARAGRAPH_BREAK.split(text))
+        return "\n\n".join(paragraph for paragraph in paragraphs if paragraph)
+    
+    def mark_pdf_paragraphs(self, page: str) -> str:
+        """Insert a blank line after each line of PDF text that ends a paragraph
         
-        # Remove page numbers and common artifacts
-        text = re.sub(r'\n\d+\n', '\n', text)
-        text = re.sub(r'\f', '', text)
+        Extracted PDF text has a line break after every line and seldom a
+        blank line between paragraphs. A line ending a sentence well short
+        of the longest line on the page is taken as a paragraph's last line.
+        """
+        lines = page.split('\n')
+        width = max((len(line.rstrip()) for line in lines), default=0)
+        marked = []
+        for line in lines:
+            marked.append(line)
+            line = line.rstrip()
+            if line.endswith(('.', '!', '?', ':')) and len(line) < 0.75 * width:
+                marked.append('')
+        return '\n'.join(marked)
+    
+    def clean_pages(self, pages: Iterable[str]) -> Tuple[str, List[Tuple[int, int]]]:
+        """Clean each page and join them, recording (offset, page_number) page starts
         
-        return text
+        Pages are separated like paragraphs, so no paragraph spans two pages.
+        """
+        parts = []
+        page_starts = []
+        offset = 0
+        for page_number, page in enumerate(pages, start=1):
+            cleaned = self.clean_text(self.mark_pdf_paragraphs(page))
+            if not cleaned:
+                continue
+            if parts:
+                offset += 2  # joining blank line
+            page_starts.append((offset, page_number))
+            parts.append(cleaned)
+            offset += len(cleaned)
+        return "\n\n".join(parts), page_starts
+    
+    def map_sentences_to_pages(self, spans: array, page_starts: List[Tuple[int, int]]) -> array:
+        """Page number of each sentence (empty when the document has no pages)"""
+        if not page_starts:
+            return array('i')
+        offsets = [offset for offset, _ in page_starts]
+        return array('i', (
+            page_starts[bisect_right(offsets, spans[i]) - 1][1] for i in range(0, len(spans), 2)
+        ))
     
     def extract_paragraphs(self, text: str) -> List[str]:
         """Extract paragraphs from text"""
@@ -95,31 +255,107 @@ class DocumentProcessor:
         
         return clean_paragraphs
     
-    def find_relevant_context(self, text: str, query: str, max_chars: int = 500) -> List[str]:
-        """Find relevant text segments for a query"""
-        sentences = sent_tokenize(text)
-        query_words = set(word_tokenize(query.lower()))
-        
-        # Score sentences based on query relevance
-        scored_sentences = []
-        for i, sentence in enumerate(sentences):
-            sentence_words = set(word_tokenize(sentence.lower()))
-            common_words = query_words.intersection(sentence_words)
-            score = len(common_words) / len(query_words) if query_words else 0
-            scored_sentences.append((score, sentence, i))
-        
-        # Sort by relevance and return top contexts
-        scored_sentences.sort(reverse=True, key=lambda x: x[0])
-        
-        relevant_contexts = []
-        for score, sentence, idx in scored_sentences[:3]:
-            if score > 0:
-                # Get surrounding context
-                start_idx = max(0, idx - 1)
-                end_idx = min(len(sentences), idx + 2)
-                context = " ".join(sentences[start_idx:end_idx])
-                if len(context) <= max_chars:
-                    relevant_contexts.append(context)
-        
-        return relevant_contexts
+    def tokenize_for_index(self, text: str) -> List[str]:
+        """Lowercase word tokens with stopwords and punctuation removed"""
+        return self.tokenizer.terms(text)
+    
+    def build_index(self, text: str, tokenized: TokenizedText, chunk_spans: array = None) -> BM25Index:
+        """Build a BM25 inverted index with one entry per chunk (per sentence without chunks)
 
+        Terms are counted in the chunk that holds them by character offset,
+        so a sentence spread over several chunks is not indexed in each.
+        """
+        if chunk_spans is None:
+            return BM25Index().build_from_postings(tokenized.postings(), list(tokenized.sentence_lengths))
+        ranges = self.chunker.sentence_ranges(chunk_spans, tokenized.sentence_spans)
+        units = self.tokenizer.span_term_counts(text, tokenized, chunk_spans, ranges)
+        return BM25Index().build_from_postings(tokenized.postings(units), tokenized.unit_lengths(units))
+    
+    def build_vector_store(self, chunks: List[str]) -> "VectorStore":
+        """Embed chunks in batches and persist them as a memory-mapped matrix"""
+        from vector_store import DEFAULT_VECTOR_DIR, VectorStore
+        key = VectorStore.key_for(chunks, self.embedder.model_name, self.vector_dtype)
+        path = os.path.join(self.vector_dir or DEFAULT_VECTOR_DIR, f"{key}.npy")
+        store = VectorStore(path)
+        # Reuse an earlier file only if it still matches these chunks and this model
+        if store.has_shape(len(chunks), self.embedder.dimension, self.vector_dtype):
+            return store
+        return VectorStore.create(path, self.embedder.encode(chunks), dtype=self.vector_dtype)
+    
+    def find_relevant_context(self, document: Union[Document, str], query: str, max_chars: int = None,
+                              top_k: int = 3) -> List[str]:
+        """Find relevant text segments for a query
+        
+        `document` is the Document returned by process_document, whose prebuilt
+        index is queried directly. Plain text is still accepted but is
+        chunked and indexed on every call, and always uses BM25. Passages
+        longer than max_chars, if given, are cut at a word boundary.
+        """
+        with metrics.timer('retrieval'):
+            return self._find_relevant_context(document, query, max_chars, top_k)
+    
+    def _find_relevant_context(self, document: Union[Document, str], query: str, max_chars: Optional[int],
+                               top_k: int) -> List[str]:
+        if isinstance(document, str):
+            document = self.build_document(document)
+        
+        if self.retrieval_mode == 'embedding' and document.vector_store is not None:
+            hits = document.vector_store.search(self.embedder.encode([query])[0], top_k=top_k)
+        else:
+            hits = document.index.search(self.tokenize_for_index(query), top_k=top_k)
+        
+        return self.chunk_contexts(document, [idx for _, idx in hits], max_chars)
+    
+    def chunk_passages(self, document: Document, chunk_ids: Sequence[int]) -> List[Tuple[int, int, int]]:
+        """Merge hits on overlapping neighbouring chunks into passages
+        
+        Returns (position, first_chunk, last_chunk) per passage, best first,
+        where position is the index in chunk_ids of the passage's best hit.
+        Merging sends the text two chunks share only once.
+        """
+        spans = document.chunk_spans
+        
+        def overlaps(left: int, right: int) -> bool:
+            return right == left + 1 and spans[2 * right] < spans[2 * left + 1]
+        
+        passages: List[List[int]] = []
+        for position, idx in enumerate(chunk_ids):
+            for passage in passages:
+                if passage[1] <= idx <= passage[2]:
+                    break
+                if overlaps(passage[2], idx):
+                    passage[2] = idx
+                    break
+                if overlaps(idx, passage[1]):
+                    passage[1] = idx
+                    break
+            else:
+                passages.append([position, idx, idx])
+        return [tuple(passage) for passage in passages]
+    
+    def passage_context(self, document: Document, first: int, last: int, max_chars: int = None,
+                        source: str = None) -> str:
+        """Text of chunks first..last, prefixed with its citation"""
+        spans = document.chunk_spans
+        context = document.cleaned_text[spans[2 * first]:spans[2 * last + 1]]
+        if max_chars is not None and len(context) > max_chars:
+            context = context[:max_chars].rsplit(' ', 1)[0]
+        pages = document.chunk_pages[first:last + 1] if document.chunk_pages else ()
+        label = self.citation_label(pages, source)
+        return f"{label} {context}" if label else context
+    
+    def chunk_contexts(self, document: Document, chunk_ids: Sequence[int], max_chars: int = None,
+                       source: str = None) -> List[str]:
+        """Cited passages for ranked chunk hits, best first"""
+        return [
+            self.passage_context(document, first, last, max_chars, source)
+            for _, first, last in self.chunk_passages(document, chunk_ids)
+        ]
+    
+    def citation_label(self, pages: Sequence[int], source: str = None) -> str:
+        """Citation label such as '[Page 4]', '[Pages 4-5]' or '[paper.pdf, Page 4]'"""
+        parts = [source] if source else []
+        if pages:
+            first, last = min(pages), max(pages)
+            parts.append(f"Page {first}" if first == last else f"Pages {first}-{last}")
+        return f"[{', '.join(parts)}]" if parts else ""
@@ -0,0 +1,393 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Callable, Dict, Iterator, Optional, TypeVar
+
+from metrics import metrics
+from rate_limiter import backoff_delay, is_retryable
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the API while the circuit breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's overall deadline passed before any attempt succeeded"""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated API failures, then lets a single probe through
+
+    Closed: calls pass and consecutive failures are counted. After
+    failure_threshold of them the breaker opens and every call fails at once
+    for reset_timeout seconds. Then it is half-open: one probe call goes
+    through, and its outcome closes or re-opens the breaker.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self._state = self.CLOSED
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless a call may go out now; True if it is the probe"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return False
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._probe_in_flight:
+                raise CircuitOpenError(
+                    f"Groq API unavailable after {self.failures} consecutive failures; "
+                    f"retrying in {max(0.0, remaining):.0f}s"
+                )
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = True
+            return True
+
+    def release_probe(self) -> None:
+        """Let another probe through after one ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+def _counts_against_breaker(error: Exception) -> bool:
+    # 429 means the API is up and we are over quota; Retry-After handles that
+    return is_retryable(error) and getattr(error, "status_code", None) != 429
+
+
+class GroqTransport:
+    """Chat completions over pooled Groq clients with retries, deadlines and hedging
+
+    One keep-alive connection pool per client is shared by every call. Each
+    call gets an overall deadline; every attempt's timeout is capped by what
+    is left of it. Retryable failures (429, 5xx, connection errors, timeouts)
+    are retried with jittered exponential backoff that honours Retry-After.
+    With hedge_after set, a non-streaming call that has not finished after
+    that many seconds is duplicated and whichever copy answers first wins.
+    Each model has a circuit breaker shared by all calls to it, which fails
+    fast while that model is down (pass breaker to share one across models).
+
+    Streams are retried only until their first chunk arrives and are never
+    hedged, since chunks already shown cannot be taken back.
+
+    Without api_key the SDK reads GROQ_API_KEY from the environment;
+    ai_assistant.groq_api_key also looks in .env and the placeholder.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 20.0,
+                 deadline: float = 60.0, attempt_timeout: float = 30.0,
+                 hedge_after: Optional[float] = None, max_connections: int = 20,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.attempt_timeout = attempt_timeout
+        if hedge_after is None and os.getenv("GROQ_HEDGE_AFTER"):
+            hedge_after = float(os.getenv("GROQ_HEDGE_AFTER"))
+        self.hedge_after = hedge_after
+        self.max_connections = max_connections
+        self.breaker = breaker
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._client = None
+        self._async_client = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _limits(self):
+        import httpx
+        return httpx.Limits(max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                            keepalive_expiry=60.0)
+
+    @property
+    def client(self):
+        """Blocking Groq client; the SDK's own retries are off since ours replace them"""
+        with self._lock:
+            if self._client is None:
+                with metrics.timer('import.groq'):
+                    import httpx
+                    from groq import Groq
+                self._client = Groq(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    http_client=httpx.Client(limits=self._limits(), timeout=self.attempt_timeout)
+                )
+            return self._client
+
+    @property
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                with metrics.timer('import.groq'):
+                    import httpx
+                    from groq import AsyncGroq
+                self._async_client = AsyncGroq(
+                    api_key=self.api_key,
+                    base_url=self.base_url,
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(limits=self._limits(), timeout=self.attempt_timeout)
+                )
+            return self._async_client
+
+    @property
+    def hedge_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=self.max_connections,
+                                                          thread_name_prefix="groq-hedge")
+            return self._hedge_executor
+
+    def breaker_for(self, model: str) -> CircuitBreaker:
+        if self.breaker is not None:
+            return self.breaker
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker()
+            return breaker
+
+    @property
+    def stats(self) -> Dict:
+        breakers = {'all models': self.breaker} if self.breaker is not None else dict(self._breakers)
+        tripped = [f"{model} {breaker.state}" for model, breaker in breakers.items()
+                   if breaker.state != CircuitBreaker.CLOSED]
+        return {
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'breaker': ", ".join(tripped) or CircuitBreaker.CLOSED
+        }
+
+    def _attempt_timeout(self, deadline: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Groq call exceeded its deadline")
+        return min(self.attempt_timeout, remaining)
+
+    def _retry_delay(self, attempt: int, error: Exception, deadline: float) -> Optional[float]:
+        """Backoff before the next attempt, or None if the call should fail now"""
+        if not is_retryable(error) or attempt >= self.max_retries:
+            return None
+        delay = backoff_delay(attempt, error, self.base_delay, self.max_delay)
+        if time.monotonic() + delay >= deadline:
+            return None
+        self.retries += 1
+        return delay
+
+    @staticmethod
+    def _record(breaker: CircuitBreaker, error: Optional[Exception]) -> None:
+        if error is None:
+            breaker.record_success()
+        elif _counts_against_breaker(error):
+            breaker.record_failure()
+        else:
+            # The API answered (e.g. a 400 or 429), so it is healthy
+            breaker.record_success()
+
+    def _call(self, model: str, attempt: Callable[[float], T], deadline: Optional[float] = None) -> T:
+        """Run attempt(timeout) under the model's breaker, the retry policy and a deadline"""
+        breaker = self.breaker_for(model)
+        deadline = time.monotonic() + (deadline or self.deadline)
+        attempt_number = 0
+        while True:
+            timeout = self._attempt_timeout(deadline)
+            probe = breaker.before_call()
+            try:
+                result = attempt(timeout)
+            except Exception as e:
+                self._record(breaker, e)
+                delay = self._retry_delay(attempt_number, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt_number += 1
+                continue
+            except BaseException:
+                # Cancelled or interrupted: no outcome, but a probe must not stay in flight
+                if probe:
+                    breaker.release_probe()
+                raise
+            self._record(breaker, None)
+            return result
+
+    def create(self, deadline: Optional[float] = None, **kwargs):
+        """Non-streaming chat completion (same arguments as chat.completions.create)
+
+        deadline overrides the transport's default for this call, in seconds.
+        """
+        def attempt(timeout: float):
+            return self._hedged(lambda: self.client.chat.completions.create(timeout=timeout, **kwargs))
+        return self._call(kwargs.get('model'), attempt, deadline)
+
+    def _hedged(self, send: Callable[[], T]) -> T:
+        if not self.hedge_after:
+            return send()
+        primary = self.hedge_executor.submit(send)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        backup = self.hedge_executor.submit(send)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.hedge_wins += 1
+                    # The slower copy cannot be interrupted; its result is discarded
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def stream(self, deadline: Optional[float] = None, **kwargs) -> Iterator:
+        """Streaming chat completion, retried until the first chunk arrives
+
+        The response is closed however iteration ends, so a consumer that
+        stops early or is cancelled does not keep a pooled connection.
+        """
+        def attempt(timeout: float):
+            stream = self.client.chat.completions.create(stream=True, timeout=timeout, **kwargs)
+            try:
+                chunks = iter(stream)
+                # Pull the first chunk inside the retry loop so connect and
+                # time-to-first-byte failures are retried too
+                first = next(chunks, None)
+            except BaseException:
+                stream.close()
+                raise
+            return stream, first, chunks
+
+        stream, first, chunks = self._call(kwargs.get('model'), attempt, deadline)
+        try:
+            if first is not None:
+                yield first
+            yield from chunks
+        finally:
+            stream.close()
+
+    async def _call_async(self, model: str, attempt: Callable[[float], "asyncio.Future"],
+                          deadline: Optional[float] = None):
+        breaker = self.breaker_for(model)
+        deadline = time.monotonic() + (deadline or self.deadline)
+        attempt_number = 0
+        while True:
+            timeout = self._attempt_timeout(deadline)
+            probe = breaker.before_call()
+            try:
+                result = await attempt(timeout)
+            except Exception as e:
+                self._record(breaker, e)
+                delay = self._retry_delay(attempt_number, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt_number += 1
+                continue
+            except BaseException:
+                # Cancelled or interrupted: no outcome, but a probe must not stay in flight
+                if probe:
+                    breaker.release_probe()
+                raise
+            self._record(breaker, None)
+            return result
+
+    async def acreate(self, deadline: Optional[float] = None, **kwargs):
+        """Async counterpart of create"""
+        async def attempt(timeout: float):
+            return await self._hedged_async(
+                lambda: self.async_client.chat.completions.create(timeout=timeout, **kwargs)
+            )
+        return await self._call_async(kwargs.get('model'), attempt, deadline)
+
+    async def _hedged_async(self, send: Callable[[], "asyncio.Future"]):
+        if not self.hedge_after:
+            return await send()
+        primary = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self.hedges += 1
+        backup = asyncio.ensure_future(send())
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, deadline: Optional[float] = None, **kwargs) -> AsyncIterator:
+        """Async counterpart of stream"""
+        async def attempt(timeout: float):
+            stream = await self.async_client.chat.completions.create(stream=True, timeout=timeout, **kwargs)
+            chunks = stream.__aiter__()
+            try:
+                first = await chunks.__anext__()
+            except StopAsyncIteration:
+                first = None
+            except BaseException:
+                await stream.close()
+                raise
+            return stream, first, chunks
+
+        stream, first, chunks = await self._call_async(kwargs.get('model'), attempt, deadline)
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await stream.close()
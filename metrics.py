@@ -0,0 +1,194 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds; spans in-memory retrieval up to slow LLM calls
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class LatencyHistogram:
+    """Cumulative-bucket latency histogram in the Prometheus style"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile by linear interpolation inside its bucket"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class StageStats:
+    """Everything recorded for one pipeline stage"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class MetricsRegistry:
+    """Thread-safe per-stage latency, token, cache and error metrics
+
+    Stages are dotted names such as 'document.extract' or 'llm.summary'.
+    One registry per process (the module-level `metrics`) aggregates all
+    Streamlit sessions and can be rendered in Prometheus text format.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = threading.Lock()
+
+    def _stage(self, stage: str) -> StageStats:
+        stats = self._stages.get(stage)
+        if stats is None:
+            stats = self._stages.setdefault(stage, StageStats())
+        return stats
+
+    def observe(self, stage: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            stats = self._stage(stage)
+            stats.latency.observe(seconds)
+            if error:
+                stats.errors += 1
+
+    def record_tokens(self, stage: str, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        with self._lock:
+            stats = self._stage(stage)
+            stats.prompt_tokens += prompt_tokens or 0
+            stats.completion_tokens += completion_tokens or 0
+
+    def record_usage(self, stage: str, response) -> None:
+        """Record token usage from a chat completion response, if it has any"""
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            self.record_tokens(stage, usage.prompt_tokens, usage.completion_tokens)
+
+    def record_cache(self, stage: str, hit: bool) -> None:
+        with self._lock:
+            stats = self._stage(stage)
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time a block, counting it as an error if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.observe(stage, time.perf_counter() - start, error=True)
+            raise
+        self.observe(stage, time.perf_counter() - start)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+    def snapshot(self) -> List[Dict]:
+        """One summary row per stage, slowest total time first"""
+        rows = []
+        with self._lock:
+            for stage, stats in self._stages.items():
+                lookups = stats.cache_hits + stats.cache_misses
+                rows.append({
+                    'stage': stage,
+                    'count': stats.latency.count,
+                    'errors': stats.errors,
+                    'total_s': round(stats.latency.total, 3),
+                    'p50_ms': round(stats.latency.quantile(0.5) * 1000, 1),
+                    'p95_ms': round(stats.latency.quantile(0.95) * 1000, 1),
+                    'prompt_tokens': stats.prompt_tokens,
+                    'completion_tokens': stats.completion_tokens,
+                    'cache_hit_rate': round(stats.cache_hits / lookups, 3) if lookups else None
+                })
+        rows.sort(key=lambda row: row['total_s'], reverse=True)
+        return rows
+
+    def to_prometheus(self, prefix: str = "research_assistant") -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_stage_duration_seconds Wall time per pipeline stage",
+            f"# TYPE {prefix}_stage_duration_seconds histogram",
+        ]
+        counters = {
+            'stage_errors_total': ("Stage calls that raised", []),
+            'llm_tokens_total': ("Tokens reported by the Groq API", []),
+            'cache_lookups_total': ("Cache lookups by result", []),
+        }
+        with self._lock:
+            for stage, stats in sorted(self._stages.items()):
+                label = f'stage="{stage}"'
+                cumulative = 0
+                for bound, bucket_count in zip(stats.latency.buckets, stats.latency.counts):
+                    cumulative += bucket_count
+                    lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_duration_seconds_bucket{{{label},le="+Inf"}} {stats.latency.count}')
+                lines.append(f'{prefix}_stage_duration_seconds_sum{{{label}}} {stats.latency.total}')
+                lines.append(f'{prefix}_stage_duration_seconds_count{{{label}}} {stats.latency.count}')
+
+                counters['stage_errors_total'][1].append(f'{{{label}}} {stats.errors}')
+                if stats.prompt_tokens or stats.completion_tokens:
+                    counters['llm_tokens_total'][1].append(f'{{{label},kind="prompt"}} {stats.prompt_tokens}')
+                    counters['llm_tokens_total'][1].append(f'{{{label},kind="completion"}} {stats.completion_tokens}')
+                if stats.cache_hits or stats.cache_misses:
+                    counters['cache_lookups_total'][1].append(f'{{{label},result="hit"}} {stats.cache_hits}')
+                    counters['cache_lookups_total'][1].append(f'{{{label},result="miss"}} {stats.cache_misses}')
+
+        for name, (help_text, samples) in counters.items():
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            lines.extend(f"{prefix}_{name}{sample}" for sample in samples)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0", registry: MetricsRegistry = metrics):
+    """Expose /metrics for Prometheus scraping from a daemon thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.to_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
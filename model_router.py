@@ -0,0 +1,229 @@
+"""Per-task model selection with a fast-first cascade
+
+Each task (summary, answer, challenge, evaluation, ...) has a chain of
+models, cheapest and fastest first, and a latency SLO. A call goes to the
+first model with the SLO as its deadline. It moves on to the next model
+when that call fails, is too slow or its output does not validate. The
+last model in the chain gets the transport's normal deadline, and if its
+output does not validate either the call fails with StructuredOutputError,
+so an unusable reply is never returned (or cached by the caller).
+
+Routes can be overridden with MODEL_ROUTES, either inline JSON or a path to
+a JSON file:
+
+    MODEL_ROUTES='{"answer": {"models": ["llama3-70b-8192"]}, "summary": {"latency_slo": 5}}'
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from groq_transport import CircuitOpenError
+from metrics import metrics
+from structured_output import StructuredOutputError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FAST_MODEL = "llama3-8b-8192"
+STRONG_MODEL = "llama3-70b-8192"
+
+_END = object()
+
+
+class ModelRoute:
+    """Models to try for one task, in order, and the SLO (seconds) for all but the last"""
+
+    __slots__ = ('models', 'latency_slo')
+
+    def __init__(self, models: List[str], latency_slo: Optional[float] = None):
+        if not models:
+            raise ValueError("A route needs at least one model")
+        self.models = list(models)
+        self.latency_slo = latency_slo
+
+    def deadline(self, position: int) -> Optional[float]:
+        return self.latency_slo if position < len(self.models) - 1 else None
+
+
+DEFAULT_ROUTES: Dict[str, ModelRoute] = {
+    'summary': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=10.0),
+    # Map-reduce steps are many small calls; a failure there already retries
+    'section_summary': ModelRoute([FAST_MODEL]),
+    'merge_summary': ModelRoute([FAST_MODEL]),
+    'answer': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=8.0),
+    'answer_batch': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=15.0),
+    'challenge': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=10.0),
+    'evaluation': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=8.0),
+    'evaluation_batch': ModelRoute([FAST_MODEL, STRONG_MODEL], latency_slo=15.0),
+}
+
+
+def load_routes(spec: Optional[str]) -> Dict[str, ModelRoute]:
+    """DEFAULT_ROUTES with the overrides in spec (JSON text or a JSON file path) applied"""
+    routes = dict(DEFAULT_ROUTES)
+    if not spec:
+        return routes
+    if not spec.lstrip().startswith('{'):
+        with open(spec, 'r', encoding='utf-8') as file:
+            spec = file.read()
+    for task, override in json.loads(spec).items():
+        base = routes.get(task)
+        models = override.get('models', base.models if base else [FAST_MODEL])
+        latency_slo = override.get('latency_slo', base.latency_slo if base else None)
+        routes[task] = ModelRoute(models, latency_slo)
+    return routes
+
+
+def _outcome(error: Exception) -> str:
+    if isinstance(error, StructuredOutputError):
+        return 'invalid'
+    if isinstance(error, CircuitOpenError):
+        return 'circuit_open'
+    if isinstance(error, TimeoutError) or type(error).__name__ == 'APITimeoutError':
+        return 'slow'
+    if getattr(error, 'status_code', None) == 429:
+        return 'rate_limited'
+    return 'error'
+
+
+class ModelRouter:
+    """Picks and escalates models per task and keeps a log of its decisions"""
+
+    def __init__(self, routes: Optional[Dict[str, ModelRoute]] = None, default_model: str = FAST_MODEL,
+                 history: int = 200):
+        self.routes = routes if routes is not None else load_routes(os.getenv("MODEL_ROUTES"))
+        self.default_model = default_model
+        self._decisions = deque(maxlen=history)
+        self._lock = threading.Lock()
+
+    def route(self, task: str, model: Optional[str] = None) -> ModelRoute:
+        """Route for task; an explicit model pins the call to that model alone"""
+        if model is not None:
+            return ModelRoute([model])
+        return self.routes.get(task) or ModelRoute([self.default_model])
+
+    def _record(self, task: str, model: str, seconds: float, outcome: str, escalated: bool) -> None:
+        decision = {
+            'time': time.strftime('%H:%M:%S'),
+            'task': task,
+            'model': model,
+            'outcome': outcome,
+            'seconds': round(seconds, 3),
+            'escalated': escalated
+        }
+        with self._lock:
+            self._decisions.append(decision)
+        metrics.observe(f"route.{task}.{model}", seconds, error=outcome != 'ok')
+        level = logging.WARNING if escalated else logging.INFO
+        logger.log(level, "route task=%s model=%s outcome=%s seconds=%.3f%s",
+                   task, model, outcome, seconds, " -> escalating" if escalated else "")
+
+    def recent(self, limit: int = 20) -> List[Dict]:
+        """Latest routing decisions, newest first"""
+        with self._lock:
+            return list(self._decisions)[::-1][:limit]
+
+    def _failed(self, task: str, route: ModelRoute, position: int, start: float, error: Exception) -> None:
+        """Log a failed step; re-raise if there is no model left to escalate to"""
+        last = position == len(route.models) - 1
+        self._record(task, route.models[position], time.perf_counter() - start, _outcome(error), not last)
+        if last:
+            raise error
+
+    def _finished(self, task: str, route: ModelRoute, position: int, start: float,
+                  result, validate: Optional[Callable]) -> bool:
+        """Log a successful call; False if its output should be escalated instead
+
+        Raises the StructuredOutputError when the last model's output does not validate.
+        """
+        model = route.models[position]
+        if validate is not None:
+            try:
+                validate(result)
+            except StructuredOutputError as e:
+                self._failed(task, route, position, start, e)
+                return False
+        self._record(task, model, time.perf_counter() - start, 'ok', False)
+        return True
+
+    def complete(self, task: str, call: Callable[[str, Optional[float]], T],
+                 validate: Optional[Callable[[T], object]] = None, model: Optional[str] = None) -> Tuple[str, T]:
+        """Run call(model, deadline) down the task's chain until a result is accepted
+
+        validate raises StructuredOutputError to reject a result. Returns the
+        model that produced the result along with it.
+        """
+        route = self.route(task, model)
+        for position, name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                result = call(name, route.deadline(position))
+            except Exception as e:
+                self._failed(task, route, position, start, e)
+                continue
+            if self._finished(task, route, position, start, result, validate):
+                return name, result
+
+    async def complete_async(self, task: str, call: Callable[[str, Optional[float]], Awaitable[T]],
+                             validate: Optional[Callable[[T], object]] = None,
+                             model: Optional[str] = None) -> Tuple[str, T]:
+        """Async counterpart of complete"""
+        route = self.route(task, model)
+        for position, name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                result = await call(name, route.deadline(position))
+            except Exception as e:
+                self._failed(task, route, position, start, e)
+                continue
+            if self._finished(task, route, position, start, result, validate):
+                return name, result
+
+    def stream(self, task: str, open_stream: Callable[[str, Optional[float]], Iterator],
+               model: Optional[str] = None) -> Iterator:
+        """Chunks from the first model in the chain that starts streaming
+
+        The SLO applies to the first chunk. Once chunks have been yielded
+        the stream is committed to that model.
+        """
+        route = self.route(task, model)
+        for position, name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                chunks = iter(open_stream(name, route.deadline(position)))
+                first = next(chunks, _END)
+            except Exception as e:
+                self._failed(task, route, position, start, e)
+                continue
+            self._record(task, name, time.perf_counter() - start, 'ok', False)
+            if first is not _END:
+                yield first
+                yield from chunks
+            return
+
+    async def stream_async(self, task: str, open_stream: Callable[[str, Optional[float]], AsyncIterator],
+                           model: Optional[str] = None) -> AsyncIterator:
+        """Async counterpart of stream"""
+        route = self.route(task, model)
+        for position, name in enumerate(route.models):
+            start = time.perf_counter()
+            try:
+                chunks = open_stream(name, route.deadline(position)).__aiter__()
+                try:
+                    first = await chunks.__anext__()
+                except StopAsyncIteration:
+                    first = _END
+            except Exception as e:
+                self._failed(task, route, position, start, e)
+                continue
+            self._record(task, name, time.perf_counter() - start, 'ok', False)
+            if first is not _END:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            return
@@ -0,0 +1,104 @@
+"""Offline-safe access to the NLTK data used by the Punkt tokenizer
+
+Nothing here touches the network at import time. The Punkt model is looked
+up on first use, in the pre-staged directory below and then on NLTK's
+usual search path. Only if it is missing everywhere is a download tried,
+with a short timeout, and only when NLTK_AUTO_DOWNLOAD is not "0".
+
+Pre-stage the data once (e.g. while building a container image):
+
+    python -m nltk_resources            # into ./nltk_data next to the code
+    python -m nltk_resources --dir /opt/nltk_data
+"""
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+from typing import Optional
+
+from metrics import metrics
+
+# Pre-staged data shipped next to the code is searched before NLTK's defaults
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "nltk_data"))
+DOWNLOAD_TIMEOUT = 10.0
+
+_punkt_ready = False
+_lock = threading.Lock()
+
+
+def _nltk():
+    if 'nltk' in sys.modules:
+        import nltk
+    else:
+        with metrics.timer('import.nltk'):
+            import nltk
+    if os.path.isdir(NLTK_DATA_DIR) and NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    return nltk
+
+
+def punkt_resource() -> str:
+    """Name of the Punkt package this NLTK version loads ('punkt_tab' from 3.8.2 on)"""
+    from nltk.tokenize import punkt
+    return 'punkt_tab' if hasattr(punkt, 'PunktTokenizer') else 'punkt'
+
+
+def _download(nltk, resource: str, download_dir: Optional[str]) -> bool:
+    # nltk.download has no timeout of its own and would hang on a dead network
+    previous = socket.getdefaulttimeout()
+    socket.setdefaulttimeout(DOWNLOAD_TIMEOUT)
+    try:
+        return bool(nltk.download(resource, download_dir=download_dir, quiet=True, raise_on_error=False))
+    except Exception:
+        return False
+    finally:
+        socket.setdefaulttimeout(previous)
+
+
+def require_punkt() -> None:
+    """Make sure the Punkt sentence model can be loaded, or raise a clear LookupError"""
+    global _punkt_ready
+    if _punkt_ready:
+        return
+    with _lock:
+        if _punkt_ready:
+            return
+        nltk = _nltk()
+        resource = punkt_resource()
+        with metrics.timer('startup.nltk_data'):
+            try:
+                nltk.data.find(f'tokenizers/{resource}')
+            except LookupError:
+                if os.getenv("NLTK_AUTO_DOWNLOAD", "1") == "0" or not _download(nltk, resource, None):
+                    raise LookupError(
+                        f"NLTK resource '{resource}' is not installed and could not be downloaded. "
+                        f"Run `python -m nltk_resources` to pre-stage it, point NLTK_DATA at a directory "
+                        f"that has it, or set TOKENIZER_MODE=regex."
+                    ) from None
+                nltk.data.find(f'tokenizers/{resource}')
+        _punkt_ready = True
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Download the NLTK data the tokenizer needs.")
+    parser.add_argument("--dir", default=NLTK_DATA_DIR, help="Target directory (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    nltk = _nltk()
+    print(f"import nltk: {time.perf_counter() - start:.2f}s")
+
+    resource = punkt_resource()
+    os.makedirs(args.dir, exist_ok=True)
+    start = time.perf_counter()
+    if not _download(nltk, resource, args.dir):
+        print(f"Failed to download '{resource}' into {args.dir}", file=sys.stderr)
+        return 1
+    print(f"Downloaded '{resource}' into {args.dir} in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
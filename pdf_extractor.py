@@ -0,0 +1,119 @@
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+ProgressCallback = Callable[[int, int], None]
+
+
+def _pdf_reader(file):
+    # Imported on first use so TXT-only processing never loads PyPDF2
+    import PyPDF2
+    return PyPDF2.PdfReader(file)
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    """Worker: open the PDF independently and extract pages [start, end)"""
+    with open(pdf_path, 'rb') as file:
+        reader = _pdf_reader(file)
+        return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+class PDFExtractor:
+    """Page-level PDF text extraction, optionally fanned out to a process pool
+
+    Pages are handed to workers in small ranges with a bounded number of
+    ranges in flight, and results are yielded in page order as soon as they
+    are ready. Only a window of pages is ever held in memory, however long
+    the document is.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, pages_per_task: int = 8,
+                 parallel_threshold: int = 16):
+        self.max_workers = max_workers or max(1, (os.cpu_count() or 1) - 1)
+        self.pages_per_task = pages_per_task
+        # Below this many pages the process start-up costs more than it saves
+        self.parallel_threshold = parallel_threshold
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One extractor may be shared by several Streamlit sessions
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # Forking the multi-threaded Streamlit server can copy a lock some
+                # other thread holds and hang the worker, so workers start fresh
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def page_count(self, pdf_path: str) -> int:
+        with open(pdf_path, 'rb') as file:
+            return len(_pdf_reader(file).pages)
+
+    def iter_pages(self, pdf_path: str, progress_callback: ProgressCallback = None) -> Iterator[Tuple[int, str]]:
+        """Yield (page_number, text) in order; page numbers start at 1"""
+        total = self.page_count(pdf_path)
+        if total < self.parallel_threshold or self.max_workers == 1:
+            pages = self._iter_serial(pdf_path, total)
+        else:
+            pages = self._iter_parallel(pdf_path, total)
+
+        for page_number, text in pages:
+            if progress_callback:
+                progress_callback(page_number, total)
+            yield page_number, text
+
+    def extract_pages(self, pdf_path: str, progress_callback: ProgressCallback = None) -> List[str]:
+        """Text of every page, indexed by page_number - 1"""
+        return [text for _, text in self.iter_pages(pdf_path, progress_callback)]
+
+    def extract_text(self, pdf_path: str, progress_callback: ProgressCallback = None) -> str:
+        """Full document text with pages separated by newlines"""
+        return "\n".join(self.extract_pages(pdf_path, progress_callback)).strip()
+
+    def _iter_serial(self, pdf_path: str, total: int) -> Iterator[Tuple[int, str]]:
+        with open(pdf_path, 'rb') as file:
+            reader = _pdf_reader(file)
+            for i in range(total):
+                yield i + 1, reader.pages[i].extract_text() or ""
+
+    def _iter_parallel(self, pdf_path: str, total: int) -> Iterator[Tuple[int, str]]:
+        ranges = deque(
+            (start, min(start + self.pages_per_task, total))
+            for start in range(0, total, self.pages_per_task)
+        )
+        in_flight = deque()
+        max_in_flight = self.max_workers * 2
+
+        try:
+            while ranges or in_flight:
+                while ranges and len(in_flight) < max_in_flight:
+                    start, end = ranges.popleft()
+                    in_flight.append((start, self.executor.submit(_extract_page_range, pdf_path, start, end)))
+
+                start, future = in_flight.popleft()
+                for offset, text in enumerate(future.result()):
+                    yield start + offset + 1, text
+        finally:
+            # Generator closed early (e.g. upload cancelled): drop queued work
+            for _, future in in_flight:
+                future.cancel()
@@ -0,0 +1,161 @@
+import hashlib
+import itertools
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+
+DEFAULT_MAX_UPLOAD_MB = 200
+COPY_CHUNK_BYTES = 1024 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """An upload is over the configured size limit"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once it has been asked to stop"""
+
+
+def max_upload_bytes() -> int:
+    return int(os.getenv("MAX_UPLOAD_MB", DEFAULT_MAX_UPLOAD_MB)) * 1024 * 1024
+
+
+def save_upload(source: BinaryIO, suffix: str, max_bytes: Optional[int] = None,
+                chunk_size: int = COPY_CHUNK_BYTES) -> Tuple[str, str]:
+    """Copy an uploaded file object to a temporary file in fixed-size chunks
+
+    Hashes the bytes on the way so the file does not have to be read again,
+    and stops as soon as the copy passes max_bytes. Returns the temporary
+    path and the SHA-256 hex digest; the caller owns the file.
+    """
+    if max_bytes is None:
+        max_bytes = max_upload_bytes()
+    digest = hashlib.sha256()
+    copied = 0
+    source.seek(0)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as target:
+        try:
+            for chunk in iter(lambda: source.read(chunk_size), b''):
+                copied += len(chunk)
+                if copied > max_bytes:
+                    raise UploadTooLarge(f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                target.write(chunk)
+        except BaseException:
+            target.close()
+            os.unlink(target.name)
+            raise
+    return target.name, digest.hexdigest()
+
+
+class ProcessingJob:
+    """One document being processed in the background
+
+    The worker reports progress with report() and calls check_cancelled()
+    at safe points (every page and every processing stage), so cancel()
+    takes effect at the next one. A queued job still starts, so that its
+    work function gets to clean up after itself, and stops at its first
+    check.
+    """
+
+    def __init__(self, job_id: str, name: str):
+        self.job_id = job_id
+        self.name = name
+        self.state = 'queued'
+        self.stage = "Waiting for a worker..."
+        self.fraction = 0.0
+        self.started = time.time()
+        self.future: Optional[Future] = None
+        self._cancel = threading.Event()
+
+    def report(self, stage: str, fraction: Optional[float] = None) -> None:
+        self.stage = stage
+        if fraction is not None:
+            self.fraction = min(max(fraction, 0.0), 1.0)
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancel.is_set():
+            raise JobCancelled(f"Processing of {self.name} was cancelled")
+
+    @property
+    def done(self) -> bool:
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def result(self):
+        """The job's return value; raises its error if it failed or was cancelled"""
+        if self.state == 'cancelled':
+            raise JobCancelled(f"Processing of {self.name} was cancelled")
+        return self.future.result()
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        if self.state != 'failed':
+            return None
+        return self.future.exception()
+
+
+class JobManager:
+    """Worker pool that runs document processing off the Streamlit script thread
+
+    Jobs get an ID a session can keep across reruns; the pool size bounds
+    how many documents are processed at once across all sessions, and the
+    most recent max_jobs jobs are kept for lookup.
+    """
+
+    def __init__(self, max_workers: int = None, max_jobs: int = 100):
+        if max_workers is None:
+            max_workers = int(os.getenv("PROCESSING_WORKERS", 2))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="processing")
+        self._jobs: "OrderedDict[str, ProcessingJob]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+
+    def submit(self, name: str, work: Callable[[ProcessingJob], object]) -> ProcessingJob:
+        """Run work(job) on the pool and return the job straight away"""
+        with self._lock:
+            job = ProcessingJob(f"job-{next(self._ids)}", name)
+            self._jobs[job.job_id] = job
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        job.future = self._executor.submit(self._run, job, work)
+        return job
+
+    def get(self, job_id: str) -> Optional[ProcessingJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pop(self, job_id: str) -> Optional[ProcessingJob]:
+        """Stop tracking a job, e.g. once its session has taken the result"""
+        with self._lock:
+            return self._jobs.pop(job_id, None)
+
+    @staticmethod
+    def _run(job: ProcessingJob, work: Callable[[ProcessingJob], object]):
+        job.state = 'running'
+        try:
+            result = work(job)
+        except BaseException:
+            # Errors raised while stopping (e.g. wrapped by the PDF reader) still count as a cancel
+            job.state = 'cancelled' if job.cancelled else 'failed'
+            raise
+        job.report("Done", 1.0)
+        job.state = 'done'
+        return result
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {state: states.count(state) for state in ('queued', 'running', 'done', 'failed', 'cancelled')}
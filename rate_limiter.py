@@ -0,0 +1,132 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, from a Retry-After header if present"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def is_retryable(error: Exception) -> bool:
+    # By the time a call has failed the Groq client, and so groq, is loaded already
+    from groq import APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def backoff_delay(attempt: int, error: Exception, base_delay: float, max_delay: float) -> float:
+    """Seconds to wait before retry number attempt + 1
+
+    Retry-After wins when the server sends it. Otherwise full jitter over an
+    exponentially growing window keeps many clients from retrying in lockstep.
+    """
+    retry_after = retry_after_seconds(error)
+    if retry_after is not None:
+        return retry_after
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until amount tokens are available and take them"""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate_per_second)
+
+
+class RequestScheduler:
+    """Runs LLM calls under requests-per-minute and tokens-per-minute limits
+
+    Concurrency is capped by a semaphore. A call is only sent once both
+    buckets can cover it. Retryable failures are retried with jittered
+    exponential backoff. A 429 with Retry-After pauses every caller, not just
+    the one that was rejected, because the quota is shared.
+    """
+
+    def __init__(self, requests_per_minute: float = 30, tokens_per_minute: float = 6000,
+                 max_concurrency: int = 4, max_retries: int = 5,
+                 base_delay: float = 1.0, max_delay: float = 60.0):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._max_concurrency = max_concurrency
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._paused_until = 0.0
+        self.retries = 0
+        self.rate_limited = 0
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the loop that actually runs the calls
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        return self._semaphore
+
+    async def run(self, call: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """Run call() once capacity allows, retrying transient failures"""
+        attempt = 0
+        while True:
+            async with self.semaphore:
+                await self._wait_for_pause()
+                await self.request_bucket.acquire(1)
+                if estimated_tokens:
+                    await self.token_bucket.acquire(estimated_tokens)
+                try:
+                    return await call()
+                except Exception as e:
+                    if not is_retryable(e) or attempt >= self.max_retries:
+                        raise
+                    delay = self._backoff(attempt, e)
+
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        if getattr(error, "status_code", None) == 429:
+            self.rate_limited += 1
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        return backoff_delay(attempt, error, self.base_delay, self.max_delay)
+
+    async def _wait_for_pause(self) -> None:
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
@@ -0,0 +1,122 @@
+import heapq
+import math
+from array import array
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class BM25Index:
+    """Inverted index over text units scored with Okapi BM25"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> list of (unit_id, term_frequency)
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.avg_doc_length = 0.0
+        self._length_norms: List[float] = []
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_lengths)
+
+    def build(self, tokenized_units: List[List[str]]) -> "BM25Index":
+        """Build postings lists from pre-tokenized units (e.g. sentences)"""
+        self.postings = {}
+        self.doc_lengths = []
+
+        for unit_id, tokens in enumerate(tokenized_units):
+            self.doc_lengths.append(len(tokens))
+            term_counts: Dict[str, int] = {}
+            for token in tokens:
+                term_counts[token] = term_counts.get(token, 0) + 1
+            for term, count in term_counts.items():
+                self.postings.setdefault(term, []).append((unit_id, count))
+
+        self._finalize()
+        return self
+
+    def _finalize(self) -> None:
+        total = sum(self.doc_lengths)
+        self.avg_doc_length = total / len(self.doc_lengths) if self.doc_lengths else 0.0
+
+        # Precompute the length part of the BM25 denominator once per unit
+        avg = self.avg_doc_length or 1.0
+        self._length_norms = [
+            self.k1 * (1 - self.b + self.b * length / avg) for length in self.doc_lengths
+        ]
+
+    def __getstate__(self):
+        # Pack postings into flat int arrays so pickled indexes stay compact
+        terms = list(self.postings)
+        offsets = array('i', [0])
+        unit_ids = array('i')
+        term_freqs = array('i')
+        for term in terms:
+            for unit_id, tf in self.postings[term]:
+                unit_ids.append(unit_id)
+                term_freqs.append(tf)
+            offsets.append(len(unit_ids))
+        return {
+            'k1': self.k1,
+            'b': self.b,
+            'terms': terms,
+            'offsets': offsets,
+            'unit_ids': unit_ids,
+            'term_freqs': term_freqs,
+            'doc_lengths': array('i', self.doc_lengths)
+        }
+
+    def __setstate__(self, state):
+        self.__init__(k1=state['k1'], b=state['b'])
+        offsets = state['offsets']
+        unit_ids = state['unit_ids']
+        term_freqs = state['term_freqs']
+        postings = {}
+        for i, term in enumerate(state['terms']):
+            start, end = offsets[i], offsets[i + 1]
+            postings[term] = list(zip(unit_ids[start:end], term_freqs[start:end]))
+        self.build_from_postings(postings, list(state['doc_lengths']))
+
+    def build_from_postings(self, postings: Dict[str, List[Tuple[int, int]]],
+                            doc_lengths: List[int]) -> "BM25Index":
+        """Restore an index from existing postings lists and unit lengths"""
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self._finalize()
+        return self
+
+    def nbytes(self) -> int:
+        """Rough in-memory size of the postings, their term keys and the unit lengths"""
+        posting_count = sum(len(postings) for postings in self.postings.values())
+        # (unit_id, tf) tuple, a boxed unit_id and the list slot; dict entry, key and list per term
+        return posting_count * 96 + len(self.postings) * 160 + len(self.doc_lengths) * 40
+
+    def idf(self, term: str) -> float:
+        """Inverse document frequency of a term (BM25+ style, never negative)"""
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    def search(self, query_terms: List[str], top_k: int = 3,
+               idf: Optional[Callable[[str], float]] = None) -> List[Tuple[float, int]]:
+        """Return up to top_k (score, unit_id) pairs, best first
+
+        Only the posting lists of the query terms are visited, so the cost
+        depends on how often those terms occur rather than on document size.
+        idf overrides this index's own IDF, e.g. with corpus-wide statistics
+        so that scores from several indexes can be compared.
+        """
+        idf_of = idf or self.idf
+        scores: Dict[int, float] = {}
+        for term in set(query_terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            term_idf = idf_of(term)
+            for unit_id, tf in postings:
+                weight = term_idf * tf * (self.k1 + 1) / (tf + self._length_norms[unit_id])
+                scores[unit_id] = scores.get(unit_id, 0.0) + weight
+
+        # Ties keep document order so earlier units win
+        best = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(score, unit_id) for unit_id, score in best]
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from metrics import metrics
+from tokenizer import Tokenizer
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity needed to reuse an answer when the encoder suggests none
+DEFAULT_THRESHOLD = 0.9
+
+
+class HashingQuestionEncoder:
+    """Model-free question vectors from the set of hashed index terms
+
+    Word overlap says little about meaning ("after six weeks" and "after
+    twelve weeks" share most of it), so only questions with exactly the same
+    content terms, numbers included, reach the threshold: "What are the main
+    findings of the paper?" matches "main findings of the paper?" but not
+    true paraphrases, which need the sentence embedder.
+    """
+
+    default_threshold = 0.999
+
+    def __init__(self, dimension: int = 4096, tokenizer: Tokenizer = None):
+        self.dimension = dimension
+        # Questions are short, so the regex tokenizer is plenty and needs no NLTK data
+        self.tokenizer = tokenizer or Tokenizer('regex')
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in set(self.tokenizer.terms(text)):
+                vectors[row, zlib.crc32(term.encode('utf-8')) % self.dimension] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+
+class SemanticHit:
+    """A cached answer together with the earlier question it was matched to"""
+
+    __slots__ = ('result', 'question', 'similarity')
+
+    def __init__(self, result: Dict, question: str, similarity: float):
+        self.result = result
+        self.question = question
+        self.similarity = similarity
+
+    def explain(self) -> str:
+        return f'Reused the answer to "{self.question}" (similarity {self.similarity:.2f})'
+
+
+class _Shard:
+    """Question vectors and answers cached for one document"""
+
+    def __init__(self, dimension: int, capacity: int):
+        self.vectors = np.zeros((capacity, dimension), dtype=np.float32)
+        self.questions: List[Optional[str]] = [None] * capacity
+        self.results: List[Optional[Dict]] = [None] * capacity
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def slot_for_insert(self) -> int:
+        if self.size < len(self.questions):
+            self.size += 1
+            return self.size - 1
+        return int(np.argmin(self.last_used))
+
+
+class SemanticAnswerCache:
+    """Per-document cache of answers, looked up by question similarity
+
+    Each question is encoded to a unit vector; a lookup scores it against
+    every cached question for that document in one matrix product, and the
+    best match at or above the threshold is returned with its answer,
+    justification and contexts. Each document keeps at most
+    max_entries_per_document answers (least recently used are replaced) and
+    at most max_documents documents are kept.
+    """
+
+    def __init__(self, encoder=None, threshold: float = None,
+                 max_entries_per_document: int = 128, max_documents: int = 64):
+        self.encoder = encoder or HashingQuestionEncoder()
+        if threshold is None:
+            threshold = float(os.getenv("SEMANTIC_CACHE_THRESHOLD",
+                                        getattr(self.encoder, 'default_threshold', DEFAULT_THRESHOLD)))
+        self.threshold = threshold
+        self.max_entries_per_document = max_entries_per_document
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        self._shards: "OrderedDict[str, _Shard]" = OrderedDict()
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def library_key(document_keys: List[str]) -> str:
+        """Cache key for questions asked across a set of documents"""
+        digest = hashlib.sha256("\0".join(sorted(document_keys)).encode('utf-8')).hexdigest()
+        return f"library-{digest}"
+
+    def _encode(self, question: str) -> Optional[np.ndarray]:
+        """Question vector, or None if the encoder failed (e.g. its model could not be loaded)"""
+        try:
+            with metrics.timer('answer.semantic_encode'):
+                return self.encoder.encode([question])[0]
+        except Exception:
+            logger.warning("semantic cache: could not encode question", exc_info=True)
+            return None
+
+    def lookup(self, document_key: str, question: str) -> Optional[SemanticHit]:
+        """Cached answer to the most similar earlier question, or None"""
+        with self._lock:
+            shard = self._shards.get(document_key)
+            empty = shard is None or shard.size == 0
+        if empty:
+            self.misses += 1
+            metrics.record_cache('answer.semantic', False)
+            return None
+
+        vector = self._encode(question)
+        with self._lock:
+            shard = self._shards.get(document_key)
+            hit = None
+            if vector is not None and shard is not None and shard.size:
+                similarities = shard.vectors[:shard.size] @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self._clock += 1
+                    shard.last_used[best] = self._clock
+                    self._shards.move_to_end(document_key)
+                    hit = SemanticHit(shard.results[best], shard.questions[best], float(similarities[best]))
+            if hit is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        metrics.record_cache('answer.semantic', hit is not None)
+        return hit
+
+    def store(self, document_key: str, question: str, result: Dict) -> None:
+        """Remember the answer to a question about a document"""
+        vector = self._encode(question)
+        if vector is None:
+            return
+        with self._lock:
+            shard = self._shards.get(document_key)
+            if shard is None:
+                shard = self._shards[document_key] = _Shard(len(vector), self.max_entries_per_document)
+                while len(self._shards) > self.max_documents:
+                    self._shards.popitem(last=False)
+            self._shards.move_to_end(document_key)
+            slot = shard.slot_for_insert()
+            self._clock += 1
+            shard.vectors[slot] = vector
+            shard.questions[slot] = question
+            shard.results[slot] = result
+            shard.last_used[slot] = self._clock
+
+    def invalidate(self, document_key: str) -> None:
+        with self._lock:
+            self._shards.pop(document_key, None)
+
+    @property
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = sum(shard.size for shard in self._shards.values())
+            documents = len(self._shards)
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'documents': documents,
+            'entries': entries
+        }
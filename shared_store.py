@@ -0,0 +1,168 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Optional
+
+from document import Document
+from metrics import metrics
+
+DEFAULT_STORE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+class DocumentHandle:
+    """One session's reference to a document held in a SharedDocumentStore
+
+    The reference is released by release() or, at the latest, when the
+    handle is garbage collected together with the session that owned it.
+    """
+
+    __slots__ = ('key', 'document', '_finalizer', '__weakref__')
+
+    def __init__(self, store: "SharedDocumentStore", key: str, document: Document):
+        self.key = key
+        self.document = document
+        self._finalizer = weakref.finalize(self, store.release, key)
+
+    def release(self) -> None:
+        self._finalizer()
+
+
+class _Entry:
+    __slots__ = ('document', 'nbytes', 'refs')
+
+    def __init__(self, document: Document, nbytes: int):
+        self.document = document
+        self.nbytes = nbytes
+        self.refs = 0
+
+
+class SharedDocumentStore:
+    """Process-wide store of processed documents shared by all sessions
+
+    Documents are keyed by content hash (plus processor namespace), so a
+    report opened by several users is processed and held in memory once.
+    Each session holds a DocumentHandle; entries with no handles left are
+    kept for reuse and evicted least recently used first once the store
+    grows past max_bytes. Entries still referenced are never evicted.
+    """
+
+    def __init__(self, max_bytes: int = None):
+        if max_bytes is None:
+            max_bytes = int(os.getenv("SHARED_STORE_MAX_MB", DEFAULT_STORE_MAX_BYTES // (1024 * 1024))) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._loading: Dict[str, threading.Lock] = {}
+        # Keys released but not yet applied; see release()
+        self._released = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def acquire(self, key: str, loader: Callable[[], Document]) -> DocumentHandle:
+        """Handle to the document for key, calling loader once if it is not stored
+
+        Sessions asking for the same key at the same time wait for a single
+        load instead of each processing the document.
+        """
+        while True:
+            handle = self._acquire_stored(key)
+            if handle is not None:
+                return handle
+            with self._lock:
+                self._drain_released()
+                # Stored since the check above; take it instead of registering a loader
+                if key not in self._entries:
+                    key_lock = self._loading.setdefault(key, threading.Lock())
+                    break
+
+        with key_lock:
+            handle = self._acquire_stored(key)
+            if handle is not None:
+                return handle
+            try:
+                document = loader()
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            # Store the entry and retire the key lock in one step, so a session
+            # arriving in between finds either the lock or the entry
+            with self._lock:
+                self._drain_released()
+                self.misses += 1
+                entry = _Entry(document, document.nbytes())
+                entry.refs = 1
+                self._entries[key] = entry
+                self.total_bytes += entry.nbytes
+                self._loading.pop(key, None)
+                self._evict()
+        metrics.record_cache('document.shared_store', False)
+        return DocumentHandle(self, key, document)
+
+    def _acquire_stored(self, key: str) -> Optional[DocumentHandle]:
+        with self._lock:
+            self._drain_released()
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.refs += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.record_cache('document.shared_store', True)
+        return DocumentHandle(self, key, entry.document)
+
+    def release(self, key: str) -> None:
+        """Drop one reference to key
+
+        Handle finalizers call this, and garbage collection can run them on
+        a thread that already holds the store lock, so the release is only
+        queued here. It is applied now if the lock is free, otherwise by the
+        next acquire or release.
+        """
+        self._released.append(key)
+        if self._lock.acquire(blocking=False):
+            try:
+                self._drain_released()
+            finally:
+                self._lock.release()
+
+    def _drain_released(self) -> None:
+        # Caller holds self._lock
+        while self._released:
+            entry = self._entries.get(self._released.popleft())
+            if entry is None:
+                continue
+            entry.refs = max(0, entry.refs - 1)
+            if entry.refs == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Caller holds self._lock
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in [key for key, entry in self._entries.items() if entry.refs == 0]:
+            entry = self._entries.pop(key)
+            self.total_bytes -= entry.nbytes
+            if self.total_bytes <= self.max_bytes:
+                break
+
+    @property
+    def stats(self) -> Dict:
+        with self._lock:
+            self._drain_released()
+            return {
+                'documents': len(self._entries),
+                'referenced': sum(1 for entry in self._entries.values() if entry.refs),
+                'mb': round(self.total_bytes / (1024 * 1024), 1),
+                'hits': self.hits,
+                'misses': self.misses
+            }
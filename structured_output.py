@@ -0,0 +1,96 @@
+import json
+import re
+from typing import Dict, List, Optional, Sequence
+
+# Groq's JSON mode: the reply is guaranteed to be one JSON object, but its
+# shape is only described in the prompt, so it is validated here
+JSON_RESPONSE_FORMAT = {"type": "json_object"}
+
+_CODE_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$')
+
+
+class StructuredOutputError(ValueError):
+    """A completion did not match the JSON shape it was asked for"""
+
+
+def parse_json_object(text: str) -> Dict:
+    """Parse a completion that should be a single JSON object
+
+    Tolerates a surrounding code fence or stray text before and after the
+    object, which models sometimes add even in JSON mode.
+    """
+    text = _CODE_FENCE.sub('', text.strip())
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        start, end = text.find('{'), text.rfind('}')
+        if start < 0 or end <= start:
+            raise StructuredOutputError("Completion is not a JSON object") from None
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError as e:
+            raise StructuredOutputError(f"Completion is not valid JSON: {e}") from None
+    if not isinstance(data, dict):
+        raise StructuredOutputError("Completion is not a JSON object")
+    return data
+
+
+def validate_items(data: Dict, list_key: str, count: int, required: Sequence[str],
+                   optional: Sequence[str] = (), choices: Optional[Dict[str, Sequence[str]]] = None,
+                   numbered: bool = True) -> List[Dict]:
+    """Check data[list_key] holds count items with the expected string fields
+
+    With numbered=True every item carries an "id" from 1 to count, and the
+    items are returned in id order whatever order the model wrote them in.
+    Values listed in choices are matched case-insensitively and returned in
+    their canonical spelling. Missing optional fields become "".
+    """
+    items = data.get(list_key)
+    if not isinstance(items, list):
+        raise StructuredOutputError(f'Expected a "{list_key}" list')
+
+    by_position: Dict[int, Dict] = {}
+    for position, item in enumerate(items, start=1):
+        if not isinstance(item, dict):
+            raise StructuredOutputError(f'Items of "{list_key}" must be objects')
+        if numbered:
+            try:
+                position = int(item.get('id'))
+            except (TypeError, ValueError):
+                raise StructuredOutputError(f'Item without a numeric "id" in "{list_key}"') from None
+        if not 1 <= position <= count:
+            if numbered:
+                raise StructuredOutputError(f'Unexpected id {position} in "{list_key}"')
+            break  # extra unnumbered items are ignored
+
+        clean = {}
+        for field in required:
+            value = item.get(field)
+            if not isinstance(value, str) or not value.strip():
+                raise StructuredOutputError(f'Item {position} has no "{field}"')
+            clean[field] = value.strip()
+        for field in optional:
+            value = item.get(field)
+            clean[field] = value.strip() if isinstance(value, str) else ""
+        for field, allowed in (choices or {}).items():
+            canonical = {choice.lower(): choice for choice in allowed}
+            if clean.get(field, "").lower() not in canonical:
+                raise StructuredOutputError(f'Item {position} has an invalid "{field}": {clean.get(field)!r}')
+            clean[field] = canonical[clean[field].lower()]
+        by_position[position] = clean
+
+    missing = [position for position in range(1, count + 1) if position not in by_position]
+    if missing:
+        raise StructuredOutputError(f'"{list_key}" is missing items {missing}')
+    return [by_position[position] for position in range(1, count + 1)]
+
+
+def should_split(error: Exception) -> bool:
+    """Whether a failed batch is worth retrying as two smaller batches
+
+    True for malformed output and for requests the API rejected as a whole
+    (Groq answers 400 when JSON mode output fails validation, 413 when the
+    prompt is too large). Outages and rate limits are not: smaller batches
+    would only send more requests to a failing API.
+    """
+    return isinstance(error, StructuredOutputError) or getattr(error, 'status_code', None) in (400, 413, 422)
@@ -0,0 +1,36 @@
+from chunker import Chunker
+from tokenizer import Tokenizer
+
+TEXT = (
+    "Methods\n\n"
+    "We observed 200 dogs for 12 weeks. Observers recorded sleep duration and play frequency. "
+    "Statistical analysis used mixed models.\n\n"
+    "Results\n\n"
+    "Dogs slept on average 14 hours per day. Play frequency correlated with owner age. "
+    "The main finding is that urban dogs sleep more than rural dogs."
+)
+
+
+def chunk_texts(text, chunker):
+    text, tokenized = Tokenizer('regex').tokenize(text)
+    spans, _ = chunker.chunk(text, tokenized.sentence_spans)
+    return [text[spans[i]:spans[i + 1]] for i in range(0, len(spans), 2)]
+
+
+def test_heading_moves_to_the_chunk_with_its_body():
+    chunks = chunk_texts(TEXT, Chunker(max_chars=200, overlap_chars=40))
+    assert chunks[0].startswith("Methods\n\nWe observed")
+    assert chunks[0].endswith("mixed models.")
+    assert chunks[1].startswith("Results\n\nDogs slept")
+
+
+def test_short_paragraphs_are_merged():
+    chunks = chunk_texts("First point.\n\nSecond point.\n\nThird point.", Chunker(max_chars=200, overlap_chars=40))
+    assert chunks == ["First point.\n\nSecond point.\n\nThird point."]
+
+
+def test_long_sentence_is_cut_at_spaces_within_max_chars():
+    chunks = chunk_texts("alpha " * 300 + "zebracorn.", Chunker(max_chars=400, overlap_chars=80))
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 400 for chunk in chunks)
+    assert [chunk for chunk in chunks if "zebracorn" in chunk] == [chunks[-1]]
@@ -0,0 +1,46 @@
+import os
+import pickle
+import stat
+import zlib
+
+from document_cache import DocumentCache, decode_document, encode_document
+from document_processor import DocumentProcessor
+
+TEXT = "Introduction\n\nDogs sleep a lot. Cats sleep more.\n\nResults\n\nBoth sleep about 14 hours per day."
+
+
+def test_document_round_trips_through_the_cache_format():
+    document = DocumentProcessor(tokenizer_mode='regex').build_document(TEXT, [(0, 1), (50, 2)])
+    restored = decode_document(encode_document(document))
+
+    for field in ('cleaned_text', 'sentence_spans', 'paragraph_spans', 'sentence_pages',
+                  'chunk_spans', 'chunk_pages', 'word_count'):
+        assert getattr(restored, field) == getattr(document, field), field
+    assert restored.index.postings == document.index.postings
+    assert restored.index.search(['hours']) == document.index.search(['hours'])
+    assert restored.vector_store is None
+
+
+def test_cache_directory_is_private(tmp_path):
+    path = tmp_path / "cache"
+    path.mkdir(mode=0o755)
+    DocumentCache(cache_dir=str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+class Planted:
+    loaded = False
+
+    def __reduce__(self):
+        return (setattr, (Planted, 'loaded', True))
+
+
+def test_pickled_entries_are_never_unpickled(tmp_path):
+    cache = DocumentCache(cache_dir=str(tmp_path))
+    path = cache._path("key")
+    with open(path, 'wb') as file:
+        file.write(zlib.compress(pickle.dumps({'format': 2, 'document': Planted()})))
+
+    assert cache.get("key") is None
+    assert not Planted.loaded
+    assert not os.path.exists(path)
@@ -0,0 +1,25 @@
+from document_processor import DocumentProcessor
+
+TEXT = (
+    "Methods\n\nWe observed 200 dogs for 12 weeks. Observers recorded sleep duration and play frequency. "
+    "Statistical analysis used mixed models.\n\nResults\n\nDogs slept on average 14 hours per day. "
+    "Play frequency correlated with owner age."
+)
+
+
+def test_terms_of_a_sentence_spread_over_chunks_are_indexed_where_they_are():
+    processor = DocumentProcessor(tokenizer_mode='regex')
+    document = processor.build_document("alpha " * 300 + "zebracorn.")
+
+    assert document.chunk_count > 1
+    hits = document.index.search(['zebracorn'], 3)
+    assert [unit for _, unit in hits] == [document.chunk_count - 1]
+    assert "zebracorn" in processor.find_relevant_context(document, "zebracorn")[0]
+
+
+def test_heading_sharing_a_sentence_with_the_next_chunk_is_not_indexed_twice():
+    processor = DocumentProcessor(tokenizer_mode='regex', chunk_chars=200, chunk_overlap=40)
+    document = processor.build_document("Introduction\n\n" + TEXT)
+
+    hits = document.index.search(processor.tokenize_for_index("hours"), 3)
+    assert ["hours" in document.chunks[unit] for _, unit in hits] == [True]
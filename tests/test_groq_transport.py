@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from benchmarks.mock_groq import MockGroqConfig, MockGroqServer
+from groq_transport import CircuitBreaker, CircuitOpenError, GroqTransport
+
+MODEL = "llama3-8b-8192"
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+@pytest.fixture
+def server():
+    with MockGroqServer(MockGroqConfig(latency=0.01)) as server:
+        yield server
+
+
+def test_cancelled_probe_does_not_keep_breaker_open(server):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.0)
+    breaker.record_failure()
+    transport = GroqTransport(api_key="test", base_url=server.base_url, breaker=breaker)
+
+    async def scenario():
+        # The first call after the reset timeout is the half-open probe
+        server.config.latency = 5.0
+        probe = asyncio.ensure_future(transport.acreate(model=MODEL, messages=MESSAGES))
+        await asyncio.sleep(0.5)
+        with pytest.raises(CircuitOpenError):
+            await transport.acreate(model=MODEL, messages=MESSAGES)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        server.config.latency = 0.01
+        return await transport.acreate(model=MODEL, messages=MESSAGES)
+
+    response = asyncio.run(scenario())
+    assert response.choices[0].message.content
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_abandoned_streams_give_their_connections_back(server):
+    server.config.token_latency = 0.05
+    transport = GroqTransport(api_key="test", base_url=server.base_url, max_connections=2,
+                              max_retries=0, attempt_timeout=2.0)
+    for _ in range(3):
+        chunks = transport.stream(model=MODEL, messages=MESSAGES)
+        next(chunks)
+        chunks.close()
+
+    response = transport.create(model=MODEL, messages=MESSAGES)
+    assert response.choices[0].message.content
+
+
+def test_abandoned_async_streams_give_their_connections_back(server):
+    server.config.token_latency = 0.05
+    transport = GroqTransport(api_key="test", base_url=server.base_url, max_connections=2,
+                              max_retries=0, attempt_timeout=2.0)
+
+    async def scenario():
+        for _ in range(3):
+            chunks = transport.astream(model=MODEL, messages=MESSAGES)
+            await chunks.__anext__()
+            await chunks.aclose()
+        return await transport.acreate(model=MODEL, messages=MESSAGES)
+
+    assert asyncio.run(scenario()).choices[0].message.content
@@ -0,0 +1,77 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ai_assistant import AIAssistant
+from async_assistant import AsyncAIAssistant
+from model_router import ModelRoute, ModelRouter
+from response_cache import ResponseCache
+from structured_output import StructuredOutputError
+
+ROUTES = {task: ModelRoute(["fast", "strong"], latency_slo=5.0)
+          for task in ('challenge', 'answer', 'answer_batch')}
+
+
+def response(content):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class FakeTransport:
+    """Answers every call with the next reply, recording which models were asked"""
+
+    def __init__(self, *replies):
+        self.replies = list(replies)
+        self.models = []
+
+    def _next(self, model):
+        self.models.append(model)
+        return response(self.replies.pop(0) if len(self.replies) > 1 else self.replies[0])
+
+    def create(self, deadline=None, model=None, **request):
+        return self._next(model)
+
+    async def acreate(self, deadline=None, model=None, **request):
+        return self._next(model)
+
+
+def reject(result):
+    raise StructuredOutputError("not valid")
+
+
+def test_invalid_output_escalates_then_fails_on_the_last_model():
+    router = ModelRouter(routes=ROUTES)
+    calls = []
+    with pytest.raises(StructuredOutputError):
+        router.complete('answer', lambda model, deadline: calls.append(model) or "reply", reject)
+    assert calls == ["fast", "strong"]
+    assert [decision['outcome'] for decision in router.recent()] == ['invalid', 'invalid']
+
+
+def test_invalid_challenge_reply_is_an_error_and_not_cached():
+    cache = ResponseCache()
+    transport = FakeTransport("no questions here")
+    assistant = AIAssistant(cache=cache, transport=transport, router=ModelRouter(routes=ROUTES))
+
+    questions = assistant.generate_challenge_questions("Some document text.")
+    assert questions[0]['question'].startswith("Error generating questions")
+    assert transport.models == ["fast", "strong"]
+
+    # A retry asks the model again instead of serving the bad reply from the cache
+    transport.replies = [json.dumps({'questions': [{'question': "Why?", 'expected_answer': "Because."}]})]
+    questions = assistant.generate_challenge_questions("Some document text.")
+    assert questions == [{'question': "Why?", 'expected_answer': "Because."}]
+    assert transport.models == ["fast", "strong", "fast"]
+
+
+def test_invalid_batch_reply_is_not_cached_and_the_batch_is_split():
+    cache = ResponseCache()
+    transport = FakeTransport("not json", "not json", "Answer: Yes.\nJustification: Page 1")
+    assistant = AsyncAIAssistant(cache=cache, transport=transport, router=ModelRouter(routes=ROUTES))
+
+    results = asyncio.run(assistant.answer_questions_async(["Q1?", "Q2?"], "Text.", [["Text."], ["Text."]]))
+    assert [result['answer'] for result in results] == ["Yes.", "Yes."]
+    assert assistant.batch_splits == 1
+    assert "not json" not in [cache.get(key) for key in list(cache._memory)]
@@ -0,0 +1,16 @@
+from benchmarks.synthetic import write_pdf
+from pdf_extractor import PDFExtractor
+
+
+def test_parallel_extraction_uses_spawned_workers_and_keeps_page_order(tmp_path):
+    path = write_pdf(str(tmp_path / "doc.pdf"), word_count=3000, words_per_page=100)
+    serial = PDFExtractor(max_workers=1).extract_pages(path)
+
+    extractor = PDFExtractor(max_workers=2, pages_per_task=4, parallel_threshold=1)
+    try:
+        pages = extractor.extract_pages(path)
+        assert extractor.executor._mp_context.get_start_method() == "spawn"
+    finally:
+        extractor.close()
+    assert len(pages) == 30
+    assert pages == serial
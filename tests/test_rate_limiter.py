@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from groq import APIStatusError, RateLimitError
+
+from rate_limiter import RequestScheduler, TokenBucket, backoff_delay, is_retryable
+
+REQUEST = httpx.Request("POST", "http://groq.test/openai/v1/chat/completions")
+
+
+def api_error(status_code, headers=None):
+    error_type = RateLimitError if status_code == 429 else APIStatusError
+    response = httpx.Response(status_code, headers=headers, request=REQUEST)
+    return error_type(f"HTTP {status_code}", response=response, body=None)
+
+
+def test_retry_policy_follows_status_and_retry_after():
+    assert is_retryable(api_error(429)) and is_retryable(api_error(503))
+    assert not is_retryable(api_error(400)) and not is_retryable(ValueError())
+    assert backoff_delay(3, api_error(429, {'retry-after': '7'}), 0.5, 20.0) == 7.0
+    assert 0 <= backoff_delay(10, api_error(503), 0.5, 2.0) <= 2.0
+
+
+def test_scheduler_retries_transient_errors_and_pauses_on_retry_after():
+    scheduler = RequestScheduler(requests_per_minute=6000, base_delay=0.01, max_delay=0.01)
+    errors = [api_error(429, {'retry-after': '0.2'}), api_error(503)]
+
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    start = time.monotonic()
+    assert asyncio.run(scheduler.run(call)) == "ok"
+    assert time.monotonic() - start >= 0.2
+    assert scheduler.retries == 2 and scheduler.rate_limited == 1
+
+
+def test_scheduler_does_not_retry_client_errors():
+    scheduler = RequestScheduler(requests_per_minute=6000)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise api_error(400)
+
+    with pytest.raises(APIStatusError):
+        asyncio.run(scheduler.run(call))
+    assert len(calls) == 1
+
+
+def test_token_bucket_waits_for_refill_and_caps_large_requests():
+    bucket = TokenBucket(rate_per_minute=600, capacity=2)
+
+    async def take():
+        start = time.monotonic()
+        await bucket.acquire(2)
+        await bucket.acquire(1)  # bucket is empty; refills at 10 per second
+        await bucket.acquire(50)  # more than it can ever hold: waits for a full bucket
+        return time.monotonic() - start
+
+    assert 0.2 <= asyncio.run(take()) < 2.0
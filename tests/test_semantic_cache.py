@@ -0,0 +1,35 @@
+from semantic_cache import HashingQuestionEncoder, SemanticAnswerCache
+
+ANSWER = {'answer': "Scores rose.", 'justification': "Table 2", 'contexts_used': []}
+
+
+def test_hashing_encoder_needs_the_same_content_terms():
+    cache = SemanticAnswerCache(encoder=HashingQuestionEncoder())
+    cache.store('doc', "What happened after six weeks?", ANSWER)
+    cache.store('doc', "What are the main findings of the paper?", ANSWER)
+
+    assert cache.lookup('doc', "What happened after twelve weeks?") is None
+    assert cache.lookup('doc', "What happened after 6 weeks?") is None
+    hit = cache.lookup('doc', "main findings of the paper?")
+    assert hit is not None and hit.question == "What are the main findings of the paper?"
+    assert cache.lookup('other-doc', "main findings of the paper?") is None
+
+
+class BrokenEncoder:
+    """Stands in for a sentence embedder whose model cannot be loaded"""
+
+    def encode(self, texts):
+        raise ModuleNotFoundError("No module named 'sentence_transformers'")
+
+
+def test_encoder_failure_is_a_miss_and_stores_nothing():
+    cache = SemanticAnswerCache(encoder=BrokenEncoder(), threshold=0.9)
+    cache.store('doc', "What are the main findings?", ANSWER)
+    assert cache.stats['entries'] == 0
+
+    # Force an encode on lookup by giving the document a cached entry first
+    cache.encoder = HashingQuestionEncoder()
+    cache.store('doc', "What are the main findings?", ANSWER)
+    cache.encoder = BrokenEncoder()
+    assert cache.lookup('doc', "What are the main findings?") is None
+    assert cache.misses == 1
@@ -0,0 +1,40 @@
+import gc
+import threading
+from array import array
+
+from document import Document
+from shared_store import SharedDocumentStore
+
+
+def load():
+    return Document("Some text.", array('i', [0, 10]), array('i', [0, 10]), 2)
+
+
+def test_handles_share_one_load_and_release_their_reference():
+    store = SharedDocumentStore()
+    first = store.acquire('doc', load)
+    second = store.acquire('doc', lambda: None)
+    assert second.document is first.document
+    assert store.stats['referenced'] == 1 and store.misses == 1 and store.hits == 1
+
+    first.release()
+    del second
+    gc.collect()
+    assert store.stats['referenced'] == 0
+
+
+def test_finalizer_running_under_the_store_lock_does_not_deadlock():
+    store = SharedDocumentStore()
+    handle = store.acquire('doc', load)
+    finished = threading.Event()
+
+    def collect_while_locked():
+        # As if cyclic GC collected the handle during an allocation inside acquire
+        with store._lock:
+            handle.release()
+        finished.set()
+
+    thread = threading.Thread(target=collect_while_locked, daemon=True)
+    thread.start()
+    assert finished.wait(5)
+    assert store.stats['referenced'] == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from structured_output import StructuredOutputError, parse_json_object, should_split, validate_items
+
+
+def test_parse_json_object_tolerates_fences_and_stray_text():
+    assert parse_json_object('```json\n{"answers": []}\n```') == {'answers': []}
+    assert parse_json_object('Here you go: {"answers": []} Hope it helps!') == {'answers': []}
+    with pytest.raises(StructuredOutputError):
+        parse_json_object('["not", "an", "object"]')
+    with pytest.raises(StructuredOutputError):
+        parse_json_object('Answer: no JSON at all')
+
+
+def test_validate_items_orders_by_id_and_canonicalizes_choices():
+    data = {'evaluations': [
+        {'id': 2, 'score': 'poor', 'feedback': ' Missed it. '},
+        {'id': '1', 'score': 'GOOD', 'feedback': 'Close.'},
+    ]}
+    items = validate_items(data, 'evaluations', 2, required=('score', 'feedback'), optional=('correct_answer',),
+                           choices={'score': ('Excellent', 'Good', 'Fair', 'Poor')})
+    assert items == [
+        {'score': 'Good', 'feedback': 'Close.', 'correct_answer': ''},
+        {'score': 'Poor', 'feedback': 'Missed it.', 'correct_answer': ''},
+    ]
+
+
+@pytest.mark.parametrize('data', [
+    {'answers': [{'id': 1, 'answer': 'Yes'}]},  # one item missing
+    {'answers': [{'id': 1, 'answer': 'Yes'}, {'id': 3, 'answer': 'No'}]},  # id out of range
+    {'answers': [{'id': 1, 'answer': 'Yes'}, {'id': 2, 'answer': ' '}]},  # empty field
+    {'answers': 'Yes, no'},
+])
+def test_validate_items_rejects_incomplete_batches(data):
+    with pytest.raises(StructuredOutputError):
+        validate_items(data, 'answers', 2, required=('answer',))
+
+
+def test_only_malformed_or_rejected_batches_are_split():
+    class APIError(Exception):
+        def __init__(self, status_code):
+            self.status_code = status_code
+
+    assert should_split(StructuredOutputError("bad"))
+    assert should_split(APIError(400)) and should_split(APIError(413))
+    assert not should_split(APIError(429)) and not should_split(APIError(503))
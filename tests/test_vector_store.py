@@ -0,0 +1,46 @@
+import os
+import stat
+
+import numpy as np
+
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+
+
+class FakeEmbedder:
+    model_name = "fake-model"
+    dimension = 4
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, texts):
+        self.calls += 1
+        vectors = np.ones((len(texts), self.dimension), dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_vectors_are_written_to_a_private_directory(tmp_path):
+    path = str(tmp_path / "vectors" / "doc.npy")
+    store = VectorStore.create(path, np.eye(3, dtype=np.float32))
+
+    assert stat.S_IMODE(os.stat(tmp_path / "vectors").st_mode) == 0o700
+    assert store.has_shape(3, 3, "float32")
+    assert not store.has_shape(4)
+    assert not VectorStore(str(tmp_path / "missing.npy")).has_shape(0)
+
+
+def test_wrong_shaped_vector_file_is_rebuilt(tmp_path):
+    embedder = FakeEmbedder()
+    processor = DocumentProcessor(retrieval_mode='embedding', embedder=embedder, vector_dir=str(tmp_path))
+    chunks = ["First chunk.", "Second chunk."]
+    store = processor.build_vector_store(chunks)
+
+    # Same key, but a file with more rows than there are chunks
+    VectorStore.create(store.path, np.ones((5, 4), dtype=np.float32))
+    store = processor.build_vector_store(chunks)
+    assert embedder.calls == 2
+    assert len(store) == 2
+
+    processor.build_vector_store(chunks)
+    assert embedder.calls == 2
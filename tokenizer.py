@@ -0,0 +1,188 @@
+import re
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from document import text_spans
+from nltk_resources import require_punkt
+
+TOKENIZER_MODES = ('punkt', 'regex')
+
+# NLTK's English stopword list, bundled so startup needs no corpus download or load
+ENGLISH_STOP_WORDS = frozenset("""
+i me my myself we our ours ourselves you you're you've you'll you'd your yours yourself yourselves
+he him his himself she she's her hers herself it it's its itself they them their theirs themselves
+what which who whom this that that'll these those am is are was were be been being have has had
+having do does did doing a an the and but if or because as until while of at by for with about
+against between into through during before after above below to from up down in out on off over
+under again further then once here there when where why how all any both each few more most other
+some such no nor not only own same so than too very s t can will just don don't should should've
+now d ll m o re ve y ain aren aren't couldn couldn't didn didn't doesn doesn't hadn hadn't hasn
+hasn't haven haven't isn isn't ma mightn mightn't mustn mustn't needn needn't shan shan't shouldn
+shouldn't wasn wasn't weren weren't won won't wouldn wouldn't
+""".split())
+
+# Sentence ends at . ! or ? (optionally closed by a quote or bracket) followed by
+# whitespace and something that can start a sentence. Cruder than Punkt about
+# abbreviations.
+_SENTENCE_BOUNDARY = re.compile(r'(?:(?<=[.!?])|(?<=[.!?]["\')\]]))\s+(?=["\'(\[]?[A-Z0-9])')
+# Words with inner apostrophes/hyphens kept together, or single punctuation marks
+_WORD = re.compile(r"\w+(?:['\-]\w+)*|[^\w\s]")
+
+
+class TokenizedText:
+    """Everything derived from one tokenization pass over a text
+
+    sentence_spans holds flat (start, end) offsets of each sentence. Index
+    terms are mapped to integer IDs through vocab, and each sentence's term
+    counts are stored CSR style: sentence i owns entries
+    term_offsets[i]:term_offsets[i + 1] of term_ids and term_freqs.
+    """
+
+    __slots__ = ('sentence_spans', 'vocab', 'term_offsets', 'term_ids', 'term_freqs',
+                 'sentence_lengths', 'word_count')
+
+    def __init__(self):
+        self.sentence_spans = array('i')
+        self.vocab: Dict[str, int] = {}
+        self.term_offsets = array('i', [0])
+        self.term_ids = array('i')
+        self.term_freqs = array('i')
+        self.sentence_lengths = array('i')  # index terms per sentence
+        self.word_count = 0
+
+    @property
+    def sentence_count(self) -> int:
+        return len(self.sentence_spans) // 2
+
+    def term_counts(self, sentence: int) -> Dict[int, int]:
+        """Term ID -> count for one sentence"""
+        start, end = self.term_offsets[sentence], self.term_offsets[sentence + 1]
+        return dict(zip(self.term_ids[start:end], self.term_freqs[start:end]))
+
+    def postings(self, units: Optional[Sequence[Dict[int, int]]] = None) -> Dict[str, List[Tuple[int, int]]]:
+        """term -> [(unit, term_frequency)], the layout BM25Index uses
+
+        Each sentence is a unit unless units gives the term ID counts of
+        each unit, e.g. one per chunk (see Tokenizer.span_term_counts).
+        """
+        terms = list(self.vocab)
+        postings: Dict[str, List[Tuple[int, int]]] = {term: [] for term in terms}
+        offsets = self.term_offsets
+        if units is None:
+            for sentence in range(len(offsets) - 1):
+                for i in range(offsets[sentence], offsets[sentence + 1]):
+                    postings[terms[self.term_ids[i]]].append((sentence, self.term_freqs[i]))
+            return postings
+
+        for unit, counts in enumerate(units):
+            for term_id, count in counts.items():
+                postings[terms[term_id]].append((unit, count))
+        return postings
+
+    @staticmethod
+    def unit_lengths(units: Sequence[Dict[int, int]]) -> List[int]:
+        """Index terms per unit, for the same term counts as postings"""
+        return [sum(counts.values()) for counts in units]
+
+
+class Tokenizer:
+    """Sentence splitting, word tokenization and index-term normalization
+
+    'punkt' uses NLTK's Punkt sentence splitter and Treebank word tokenizer,
+    importing NLTK and checking for the Punkt model on first use. 'regex'
+    uses two precompiled regular expressions instead and needs no NLTK at
+    all; it is several times faster on large documents at the cost of
+    occasionally splitting after abbreviations such as "e.g.".
+    """
+
+    def __init__(self, mode: str = 'punkt', stop_words: Iterable[str] = ENGLISH_STOP_WORDS):
+        if mode not in TOKENIZER_MODES:
+            raise ValueError(f"Unsupported tokenizer mode: {mode}. Use one of {TOKENIZER_MODES}.")
+        self.mode = mode
+        self.stop_words = frozenset(stop_words)
+
+    def sentences(self, text: str) -> List[str]:
+        if self.mode == 'punkt':
+            require_punkt()
+            from nltk.tokenize import sent_tokenize
+            return sent_tokenize(text)
+        return [sentence for sentence in _SENTENCE_BOUNDARY.split(text) if sentence]
+
+    def words(self, text: str) -> List[str]:
+        if self.mode == 'punkt':
+            from nltk.tokenize import word_tokenize
+            # Input is a single sentence, so skip Punkt's own sentence split
+            return word_tokenize(text, preserve_line=True)
+        return _WORD.findall(text)
+
+    def is_term(self, token: str) -> bool:
+        return token not in self.stop_words and any(ch.isalnum() for ch in token)
+
+    def terms(self, text: str) -> List[str]:
+        """Lowercase index terms of a short text such as a query"""
+        return [token for token in self.words(text.lower()) if self.is_term(token)]
+
+    def span_term_counts(self, text: str, tokenized: TokenizedText, spans: array,
+                         sentence_ranges: Sequence[Tuple[int, int]]) -> List[Dict[int, int]]:
+        """Term ID counts of each flat (start, end) span of text, e.g. each chunk
+
+        sentence_ranges gives the (first, end) sentences overlapping each
+        span. A sentence wholly inside a span adds its counts from the
+        tokenization pass; one cut by the span's edge is tokenized again for
+        just the part inside, so its other terms go to the spans that hold
+        them. Terms first seen in such a part are added to the vocabulary.
+        """
+        sentence_spans = tokenized.sentence_spans
+        vocab = tokenized.vocab
+        units = []
+        for unit, (first, end) in enumerate(sentence_ranges):
+            start, stop = spans[2 * unit], spans[2 * unit + 1]
+            counts: Dict[int, int] = {}
+            for sentence in range(first, end):
+                sentence_start, sentence_end = sentence_spans[2 * sentence], sentence_spans[2 * sentence + 1]
+                if start <= sentence_start and sentence_end <= stop:
+                    for term_id, count in tokenized.term_counts(sentence).items():
+                        counts[term_id] = counts.get(term_id, 0) + count
+                    continue
+                part = text[max(start, sentence_start):min(stop, sentence_end)]
+                for token in self.words(part.lower()):
+                    if self.is_term(token):
+                        term_id = vocab.setdefault(token, len(vocab))
+                        counts[term_id] = counts.get(term_id, 0) + 1
+            units.append(counts)
+        return units
+
+    def tokenize(self, text: str) -> Tuple[str, TokenizedText]:
+        """Tokenize a document once into spans, term IDs and term counts
+
+        Returns the text the spans refer to alongside the result. That is the
+        input itself unless the sentence splitter changed a sentence, in which
+        case the text is rebuilt from the sentences so every span still holds.
+        """
+        sentences = self.sentences(text)
+        spans = text_spans(text, sentences)
+        if spans is None:
+            text = " ".join(sentences)
+            spans = text_spans(text, sentences)
+
+        result = TokenizedText()
+        result.sentence_spans = spans
+        vocab = result.vocab
+        for sentence in sentences:
+            counts: Dict[int, int] = {}
+            words = self.words(sentence.lower())
+            result.word_count += len(words)
+            length = 0
+            for token in words:
+                if not self.is_term(token):
+                    continue
+                term_id = vocab.get(token)
+                if term_id is None:
+                    term_id = vocab[token] = len(vocab)
+                counts[term_id] = counts.get(term_id, 0) + 1
+                length += 1
+            result.term_ids.extend(counts.keys())
+            result.term_freqs.extend(counts.values())
+            result.term_offsets.append(len(result.term_ids))
+            result.sentence_lengths.append(length)
+        return text, result
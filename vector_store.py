@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from document_cache import CACHE_ROOT, private_cache_dir
+
+# Small (~80MB) model that runs comfortably on CPU. Point EMBEDDING_MODEL at a
+# local directory to run fully offline.
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+DEFAULT_VECTOR_DIR = os.path.join(CACHE_ROOT, "vectors")
+
+
+class SentenceEmbedder:
+    """Lazily loaded sentence-transformers model pinned to the CPU"""
+
+    def __init__(self, model_name: Optional[str] = None, device: str = "cpu", batch_size: int = 64):
+        self.model_name = model_name or os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+        self.device = device
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        # Imported here so torch is only loaded when embedding retrieval is used
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                self._model = SentenceTransformer(self.model_name, device=self.device)
+            return self._model
+
+    @property
+    def dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts in batches into unit-length float32 vectors"""
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        vectors = self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return vectors.astype(np.float32, copy=False)
+
+
+class VectorStore:
+    """Embedding matrix saved as .npy on disk and read back through np.memmap
+
+    Only the path is held per instance; the matrix is mapped on first search,
+    so every session querying the same document shares the OS page cache
+    instead of holding its own copy of the vectors.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._matrix: Optional[np.memmap] = None
+
+    @staticmethod
+    def key_for(texts: List[str], model_name: str, dtype: str) -> str:
+        """Stable file key for a list of texts embedded with a given model"""
+        digest = hashlib.sha256()
+        digest.update(f"{model_name}|{dtype}".encode("utf-8"))
+        for text in texts:
+            digest.update(b"\0")
+            digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    @classmethod
+    def create(cls, path: str, vectors: np.ndarray, dtype: str = "float32") -> "VectorStore":
+        """Write vectors to path (float32 or float16) and return a store for it
+
+        The directory is created private to the current user (see
+        document_cache.private_cache_dir).
+        """
+        private_cache_dir(os.path.dirname(path) or ".")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.dtype(dtype), shape=vectors.shape)
+        matrix[:] = vectors
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @property
+    def matrix(self) -> np.memmap:
+        if self._matrix is None:
+            self._matrix = np.load(self.path, mmap_mode="r")
+        return self._matrix
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    def has_shape(self, rows: int, dimension: Optional[int] = None, dtype: Optional[str] = None) -> bool:
+        """Whether the file holds a rows x dimension matrix of dtype; False if it is missing or unreadable"""
+        try:
+            matrix = self.matrix
+        except (OSError, ValueError):
+            return False
+        return (matrix.ndim == 2 and matrix.shape[0] == rows
+                and (dimension is None or matrix.shape[1] == dimension)
+                and (dtype is None or matrix.dtype == np.dtype(dtype)))
+
+    def __getstate__(self):
+        # Never pickle the mapped matrix, only where to find it
+        return {"path": self.path, "_matrix": None}
+
+    def search(self, query_vector: np.ndarray, top_k: int = 3) -> List[Tuple[float, int]]:
+        """Return up to top_k (cosine score, row) pairs, best first"""
+        matrix = self.matrix
+        if matrix.shape[0] == 0 or top_k <= 0:
+            return []
+
+        # Rows are unit length, so one matrix-vector product gives cosine scores
+        scores = matrix @ np.asarray(query_vector, dtype=np.float32)
+        k = min(top_k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(float(scores[i]), int(i)) for i in top]